@@ -7,7 +7,7 @@ With the platesolving option the script can register mosaics and with multi sess
 
 The script can be started directly from the siril GUI, siril command line and can also be started from a ssf script using the 'pyscript' command i.e. pyscript GPS_Preprocess.py. Such a ssf script can run the this script several times i.e. to try different settings, with unique result files based on setting values. 
 
-The script also skips restacking master biases, flats, darks, background exaction and platesolving if they already exist. 
+The script also skips restacking master biases, flats, darks, background exaction and platesolving if they already exist, and skips registration and the final stack when a stack was already made from the same frames and settings. 
 
 Example ssf script to run this script
 ---
@@ -26,97 +26,171 @@ SPDX-License-Identifier: GPL-3.0-or-later
 0.1.6   Handle working directory with spaces
 0.1.7   Added tooltips
 0.1.8   Adds satellite removal using setiastropro AI4
+0.1.9   Skips registration and the final stack if one was already made from the same frames and settings, performance improvements
  
 """
 
 import sys
 import os
 import subprocess
+from pathlib import Path
 import sirilpy as s
 import argparse
 import re
+import time
+import glob
 import shlex
 
-VERSION = "0.1.8"
-	
-# PyQt6 for GUI
-try:
-	from PyQt6.QtWidgets import (
-		QApplication, QDialog, QLabel, QLineEdit, QPushButton, QCheckBox, QToolTip, QGroupBox,
-		QVBoxLayout, QHBoxLayout, QFormLayout, QDialogButtonBox, QMessageBox, QTextEdit
-	)
-except ImportError:
-	# Silently fail if PyQt6 is not installed, as it's optional for CLI mode.
+VERSION = "0.1.9"
+
+FITS_EXTS = ('.fits', '.fit', '.fts', '.fz')
+PERCENT_RE = re.compile(rb"(\d+(?:\.\d+)?)%")
+PP_LIGHT_RE = re.compile(r"^pp_light_(\d+)\.fit$")
+FILTER_RE = re.compile(r"^\d+(\.\d+)?[%k]?$")
+SEQ_COUNT_RE = re.compile(r"^S '.*' \d+ (\d+) ")
+FITS_VALUE_RE = re.compile(r"\s*(?:'((?:[^']|'')*)'|([^/]*?))\s*(?:/|$)")
+# starting directory, read once so the GUI and command line defaults agree
+CWD = os.getcwd()
+
+# raised for bad option values so the GUI can report them instead of the process exiting
+class ArgError(ValueError):
 	pass
 
-def master_bias(bias_dir, process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/bias_stacked.fit')) or os.path.exists(os.path.join(workdir, 'process/bias_stacked.fit.fz')):
+siril_cwd = None
+last_pct = -2.0
+last_time = 0.0
+connected = False
+
+DARK_STYLESHEET = """
+	QWidget {
+		background-color: #2b2b2b;
+		color: #efefef;
+	}
+	QLineEdit, QTextEdit {
+		background-color: #3b3b3b;
+		color: #efefef;
+		border: 1px solid #555;
+		padding: 2px;
+	}
+	QPushButton {
+		background-color: #4b4b4b;
+		color: #efefef;
+		border: 1px solid #555;
+		padding: 5px;
+		border-radius: 3px;
+	}
+	QPushButton:hover {
+		background-color: #5b5b5b;
+	}
+	QPushButton:pressed {
+		background-color: #3b3b3b;
+	}
+	QCheckBox {
+		spacing: 5px;
+	}
+	QCheckBox::indicator {
+		width: 15px;
+		height: 15px;
+		background-color: #3b3b3b;
+		border: 1px solid #555;
+	}
+	QCheckBox::indicator:checked {
+		background-color: #4b9ee3;
+	}
+"""
+
+def process_files(process_dir):
+	# one directory scan replaces a stat per stage when checking for earlier results
+	if not os.path.isdir(process_dir):
+		return frozenset()
+	return frozenset(entry.name for entry in os.scandir(process_dir))
+
+def cd(path):
+	# each cd is a round trip to siril, skip it when already there
+	global siril_cwd
+	if path != siril_cwd:
+		siril.cmd("cd", f'"{path}"')
+		siril_cwd = path
+
+def seq_current(seq_path, src_dir):
+	# a converted sequence is reused only with one frame per source file and no source newer than it
+	try:
+		seq_mtime = os.path.getmtime(seq_path)
+		with open(seq_path) as f:
+			count = next((int(m.group(1)) for line in f if (m := SEQ_COUNT_RE.match(line))), None)
+	except OSError:
+		return False
+	with os.scandir(src_dir) as it:
+		sources = [e.stat().st_mtime for e in it if e.is_file() and not e.name.startswith('.')]
+	return count == len(sources) and max(sources, default=0) <= seq_mtime
+
+def master_bias(bias_dir, process_dir, existing):
+	if 'bias_stacked.fit' in existing or 'bias_stacked.fit.fz' in existing:
 		print('master bias exists, skipping')
 		return
-	else:
-		siril.cmd(f"cd {bias_dir}")
+	# a sequence left by an interrupted run is reused rather than converted again
+	if not seq_current(os.path.join(process_dir, 'bias_.seq'), bias_dir):
+		cd(bias_dir)
 		siril.cmd(f"convert bias -out={process_dir}")
-		siril.cmd(f"cd  {process_dir}")
-		siril.cmd(f"stack bias rej 3 3 -nonorm")
+	cd(process_dir)
+	siril.cmd(f"stack bias rej 3 3 -nonorm")
 
-def master_flat(flat_dir, process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/pp_flat_stacked.fit')) or os.path.exists(os.path.join(workdir, 'process/pp_flat_stacked.fit.fz')):
+def master_flat(flat_dir, process_dir, existing):
+	if 'pp_flat_stacked.fit' in existing or 'pp_flat_stacked.fit.fz' in existing:
 		print('master flat exists, skipping')
 		return
-	else:
-		siril.cmd(f"cd {flat_dir}")
+	if not seq_current(os.path.join(process_dir, 'flat_.seq'), flat_dir):
+		cd(flat_dir)
 		siril.cmd(f"convert flat -out={process_dir}")
-		siril.cmd(f"cd {process_dir}")
-		siril.cmd("calibrate flat -bias=bias_stacked")
-		siril.cmd("stack pp_flat rej 3 3 -norm=mul")
+	cd(process_dir)
+	siril.cmd("calibrate flat -bias=bias_stacked")
+	siril.cmd("stack pp_flat rej 3 3 -norm=mul")
 
-def master_dark(dark_dir, process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/dark_stacked.fit')) or os.path.exists(os.path.join(workdir, 'process/dark_stacked.fit.fz')):
+def master_dark(dark_dir, process_dir, existing):
+	if 'dark_stacked.fit' in existing or 'dark_stacked.fit.fz' in existing:
 		print('master dark exists, skipping')
 		return
-	else:
-		siril.cmd(f"cd {dark_dir}")
+	if not seq_current(os.path.join(process_dir, 'dark_.seq'), dark_dir):
+		cd(dark_dir)
 		siril.cmd(f"convert dark -out={process_dir}")
-		siril.cmd(f"cd {process_dir}")
-		siril.cmd(f"stack dark rej 3 3 -nonorm")
+	cd(process_dir)
+	siril.cmd(f"stack dark rej 3 3 -nonorm")
 
-def light(light_dir, process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/pp_light_.seq')):
+def light(light_dir, process_dir, existing):
+	if 'pp_light_.seq' in existing:
 		print('pp_light exists, skipping')
 		return
-	else:
-		siril.cmd(f"cd {light_dir}")
+	if not seq_current(os.path.join(process_dir, 'light_.seq'), light_dir):
+		cd(light_dir)
 		siril.cmd(f"convert light -out={process_dir}")
-		siril.cmd(f"cd {process_dir}")
-		siril.cmd(
-			f"calibrate light -dark=dark_stacked -flat=pp_flat_stacked -cc=dark -cfa -equalize_cfa")
+	cd(process_dir)
+	siril.cmd(
+		f"calibrate light -dark=dark_stacked -flat=pp_flat_stacked -cc=dark -cfa -equalize_cfa")
 
-def light_nc(light_dir, process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/pp_light_.seq')):
+def light_nc(light_dir, process_dir, existing):
+	if 'pp_light_.seq' in existing:
 		print('pp_light exists, skipping')
 		return
-	else:
-		siril.cmd(f"cd {light_dir}")
-		siril.cmd(f"convert pp_light -out={process_dir}")
+	cd(light_dir)
+	siril.cmd(f"convert pp_light -out={process_dir}")
 
-def bkg_extract(process_dir):
-	if os.path.exists(os.path.join(workdir, 'process/bkg_pp_light_.seq')):
+def bkg_extract(process_dir, existing):
+	if 'bkg_pp_light_.seq' in existing:
 		print('background extracted, skipping')
 		return
-	else:
-		siril.cmd(f"cd {process_dir}")
-		siril.cmd(f"seqsubsky pp_light 1 -samples=10")
+	cd(process_dir)
+	siril.cmd(f"seqsubsky pp_light 1 -samples=10")
 
-def platesolve(process_dir):
+def platesolve(process_dir, existing):
 	if args.bkg:
-		if os.path.exists(os.path.join(workdir, 'process/r_bkg_pp_light_.seq')):
+		if 'r_bkg_pp_light_.seq' in existing:
 			print('sequence platesolved, skipping')
 			return
 	else:
-		if os.path.exists(os.path.join(workdir, 'process/r_pp_light_.seq')):
+		if 'r_pp_light_.seq' in existing:
 			print('sequence platesolved, skipping')
 			return
-	siril.cmd("cd " + process_dir)
+	cd(process_dir)
 	if args.platesolve == True :
 		focal = " "
 	else:
@@ -124,7 +198,7 @@ def platesolve(process_dir):
 	siril.cmd(f"seqplatesolve {light_seq} -nocache -catalog=nomad -force -disto=ps_distortion {focal}")
 
 def register(process_dir):
-	siril.cmd(f"cd {process_dir}")
+	cd(process_dir)
 	flat = " " if args.no_calibration else " -flat=pp_flat_stacked"
 	if args.platesolve:
 		siril.cmd(
@@ -134,69 +208,171 @@ def register(process_dir):
 		siril.cmd(
 			f"seqapplyreg {light_seq} -filter-bkg={bkg} -filter-nbstars={stars} -filter-round={roundf} -filter-wfwhm={wfwhm} {drizzle} {flat}")
 
+def fits_keyword(path, key):
+	# read one header value without loading the image into siril
+	card_key = f"{key:<8}=".encode('ascii')
+	naxis = None
+	with open(path, 'rb') as f:
+		while True:
+			block = f.read(2880)
+			if len(block) < 2880:
+				return None
+			for i in range(0, 2880, 80):
+				card = block[i:i + 80]
+				if card.startswith(card_key):
+					m = FITS_VALUE_RE.match(card[10:].decode('ascii', errors='replace'))
+					return m.group(1).replace("''", "'").strip() if m.group(1) is not None else m.group(2)
+				if card.startswith(b"NAXIS   ="):
+					naxis = int(card[10:30])
+				if card.rstrip() == b"END":
+					# compressed files keep the image header in the next, empty primary has NAXIS = 0
+					if naxis:
+						return None
+					naxis = None
+
+def renumber_lights(process_dir, dst_dir):
+	# find highest pp_light in 1st working directory/process
+	with os.scandir(dst_dir) as it:
+		next = max((int(m.group(1)) for entry in it if (m := PP_LIGHT_RE.match(entry.name))), default=0) + 1
+	print(f"pp_light_{next}.fit")
+	with os.scandir(process_dir) as it:
+		pps = sorted((int(m.group(1)), entry.name) for entry in it if (m := PP_LIGHT_RE.match(entry.name)))
+	for index, (_, pp) in enumerate(pps, next):
+		os.replace(f"{process_dir}/{pp}", f"{dst_dir}/pp_light_{index:05}.fit")
+
 def satellite_removal(workdir):
 	os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 	config_dir = siril.get_siril_configdir()
-	if os.path.isfile (f"{config_dir}/sirilcc_saspro.conf"):
-		config_file_path = (f"{config_dir}/sirilcc_saspro.conf")
-		with open(config_file_path, 'r') as file:
-			executable_path = file.readline().strip()
-			python_path = executable_path.replace("setiastrosuitepro", "python")
-	else:
+	try:
+		executable_path = Path(f"{config_dir}/sirilcc_saspro.conf").read_text().split("\n", 1)[0].strip()
+	except FileNotFoundError:
 		print(f"Executable not configured. Please create file 'sirilcc_saspro.conf' in your siril config directory {config_dir} with a line containing the path to setiastrosuitepro.")
 		sys.exit(1)
-
-	os.chdir(workdir)		
-	os.rename('lights', 'lights_preremoval')
-	os.mkdir('lights')
-	os.chdir('lights_preremoval')
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')):
+	python_path = executable_path.replace("setiastrosuitepro", "python")
+
+	lights_dir = os.path.join(workdir, 'lights')
+	preremoval_dir = os.path.join(workdir, 'lights_preremoval')
+	os.rename(lights_dir, preremoval_dir)
+	os.mkdir(lights_dir)
+	for image in os.listdir(preremoval_dir):
+		if image.lower().endswith(FITS_EXTS):
 			siril.log(f"Running satellite trail removal on {image}")
-			newimage = (f"{os.path.splitext(image)[0]}.fit")
-			cmd = [python_path, executable_path, "cc", "satellite", "--gpu", "--mode", "full", "--clip-trail", "-i", f"{image}", "-o", f"{workdir}/lights/{newimage}"]
+			newimage = f"{os.path.splitext(image)[0]}.fit"
+			cmd = [python_path, executable_path, "cc", "satellite", "--gpu", "--mode", "full", "--clip-trail", "-i", os.path.join(preremoval_dir, image), "-o", os.path.join(lights_dir, newimage)]
 			
 			my_env = os.environ.copy()
 			my_env.pop("PYTHONPATH", None)
-			process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-			percent_re = re.compile(r"(\d+\.?\d*)" + "%")
-			if process.stdout:
-				for line in iter(process.stdout.readline, ''):
-					line = line.strip()
-					if not line:
-						continue
-					m = percent_re.search(line)
-					if m:
-						try:
-							pct = float(m.group(1))
-							siril.update_progress(f"Satellite trail removal", pct / 100.0)
-						except ValueError:
-							siril.log(line)
-					else:
-							siril.log(line)
-			process.wait()
+			process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+			watch_progress(process, "Satellite trail removal")
+
+def log_progress(line, label):
+	global last_pct, last_time
+	line = line.strip()
+	if not line:
+		return
+	# lines stay as bytes, only the ones that are logged get decoded
+	m = PERCENT_RE.search(line) if b'%' in line else None
+	if m:
+		try:
+			pct = float(m.group(1))
+		except ValueError:
+			siril.log(line.decode('utf-8', errors='replace'))
+			return
+		# each update is a round trip to Siril, only send ones the user could see
+		now = time.monotonic()
+		if abs(pct - last_pct) >= 1.0 or now - last_time >= 0.1:
+			siril.update_progress(label, pct / 100.0)
+			last_pct, last_time = pct, now
+	else:
+		siril.log(line.decode('utf-8', errors='replace'))
+
+def watch_progress(process, label):
+	# stream the output as it arrives so memory stays bounded however much is logged
+	fd = process.stdout.fileno()
+	buf = b""
+	while True:
+		chunk = os.read(fd, 65536)
+		if not chunk:
+			break
+		buf += chunk
+		# progress bars redraw with a carriage return, treat it as a line end too
+		*lines, buf = buf.replace(b"\r", b"\n").split(b"\n")
+		for line in lines:
+			log_progress(line, label)
+	log_progress(buf, label)
+	if process.wait():
+		raise RuntimeError(f"{label} exited with code {process.returncode}")
 
 def stack(process_dir):
-	siril.cmd(f"cd {process_dir}")
-	siril.cmd("load pp_light_00001")
+	cd(process_dir)
+	name = stack_name(process_dir)
+	siril.cmd(f"stack r_{light_seq} rej 3 3 -norm=addscale -output_norm -rgb_equal -maximize -filter-included -weight=wfwhm  -feather={feather} -out=../{name}")
+	# written only once the stack is made, an interrupted stack is redone on the next run
+	Path(stack_key_path(process_dir, name)).write_text(stack_key(process_dir))
+
+def stack_current(process_dir):
+	# a stack made from the same frames with the same options needs neither registering nor stacking again
+	name = stack_name(process_dir)
 	try:
-		obj = (siril.get_image_fits_header(return_as='dict')['OBJECT']).replace(" ", "")
-	except KeyError:
-		obj = ("")
-	siril.cmd(f"stack r_{light_seq} rej 3 3 -norm=addscale -output_norm -rgb_equal -maximize -filter-included -weight=wfwhm  -feather={feather} -out=../{obj}_b{bkg}-s{stars}-r{roundf}-w{wfwhm}-z{drizzle_scale}-f{feather}-$LIVETIME:%d$s")
-	siril.cmd("close")
+		if Path(stack_key_path(process_dir, name)).read_text() != stack_key(process_dir):
+			return False
+	except FileNotFoundError:
+		return False
+	prefix = name.replace("$LIVETIME:%d$s", "")
+	return bool(glob.glob(os.path.join(glob.escape(os.path.dirname(process_dir)), f"{glob.escape(prefix)}*s.fit*")))
+
+def stack_key(process_dir):
+	# every option that shapes the stack, then each frame going in with its size and modification time
+	options = [light_seq, bkg, stars, roundf, wfwhm, drizzle, feather, str(args.platesolve), str(args.no_calibration), *(args.multi_session or [])]
+	with os.scandir(process_dir) as it:
+		frames = sorted(f"{e.name} {e.stat().st_size} {e.stat().st_mtime_ns}" for e in it
+			if e.name.startswith(f"{light_seq}_") and e.name.lower().endswith(FITS_EXTS))
+	return "\n".join(options + frames) + "\n"
+
+def stack_key_path(process_dir, name):
+	return os.path.join(process_dir, f"{name.replace('$LIVETIME:%d$s', '').rstrip('-')}.key")
+
+def stack_name(process_dir):
+	obj = ""
+	for ext in ('.fit', '.fit.fz'):
+		path = os.path.join(process_dir, f"pp_light_00001{ext}")
+		if os.path.isfile(path):
+			obj = (fits_keyword(path, 'OBJECT') or "").replace(" ", "")
+			break
+	return stack_out.format(obj=obj)
 
 # ==============================================================================
 # GUI Mode
 # ==============================================================================
 
 def run_gui():
-	if 'QApplication' not in globals():
+	# PyQt6 is optional and only needed here, so the CLI never loads it
+	try:
+		from PyQt6.QtWidgets import (
+			QApplication, QDialog, QLabel, QLineEdit, QPushButton, QCheckBox, QToolTip, QGroupBox,
+			QVBoxLayout, QHBoxLayout, QFormLayout, QDialogButtonBox, QMessageBox, QTextEdit
+		)
+	except ImportError:
 		print("PyQt6 is not installed. Please install it to use the GUI.")
 		print("pip install PyQt6")
 		return
 
 	class PreprocessingDialog(QDialog):
+		CLI_FLAGS = (
+			("workdir", "-d"),
+			("satellite", "-sr"),
+			("background", "-b"),
+			("round", "-r"),
+			("stars", "-s"),
+			("wfwhm", "-w"),
+			("feather", "-f"),
+			("drizzle", "-z"),
+			("bkg_extract", "-bg"),
+			("platesolve", "-ps"),
+			("no_calibration", "-nc"),
+			("multi", "-m"),
+		)
+
 		def __init__(self, parent=None):
 			super().__init__(parent)
 			self.setWindowTitle("Siril Preprocessing")
@@ -206,7 +382,7 @@ def run_gui():
 			form_layout = QFormLayout()
 
 			try:
-				self.workdir_input = QLineEdit(os.getcwd())
+				self.workdir_input = QLineEdit(CWD)
 				form_layout.addRow("Working Directory:", self.workdir_input)
 			except Exception as e:
 				print("Working directory does not exist:", e)
@@ -295,84 +471,28 @@ def run_gui():
 			}
 
 	app = QApplication.instance() or QApplication(sys.argv)
-	
-	dark_stylesheet = """
-		QWidget {
-			background-color: #2b2b2b;
-			color: #efefef;
-		}
-		QLineEdit, QTextEdit {
-			background-color: #3b3b3b;
-			color: #efefef;
-			border: 1px solid #555;
-			padding: 2px;
-		}
-		QPushButton {
-			background-color: #4b4b4b;
-			color: #efefef;
-			border: 1px solid #555;
-			padding: 5px;
-			border-radius: 3px;
-		}
-		QPushButton:hover {
-			background-color: #5b5b5b;
-		}
-		QPushButton:pressed {
-			background-color: #3b3b3b;
-		}
-		QCheckBox {
-			spacing: 5px;
-		}
-		QCheckBox::indicator {
-			width: 15px;
-			height: 15px;
-			background-color: #3b3b3b;
-			border: 1px solid #555;
-		}
-		QCheckBox::indicator:checked {
-			background-color: #4b9ee3;
-		}
-	"""
-	app.setStyleSheet(dark_stylesheet)
+	# style the QApplication once, it is reused when the dialog is opened again
+	if not getattr(app, "gps_styled", False):
+		app.setStyleSheet(DARK_STYLESHEET)
+		app.gps_styled = True
 
 	dialog = PreprocessingDialog()
 	if dialog.exec():
 		values = dialog.get_values()
 		cli_args = []
 
-		if values["workdir"]:
-			cli_args.extend(["-d", values["workdir"]])
-		if values["satellite"]:
-			cli_args.append("-sr")
-		if values["background"]:
-			cli_args.extend(["-b", values["background"]])
-		if values["round"]:
-			cli_args.extend(["-r", values["round"]])
-		if values["stars"]:
-			cli_args.extend(["-s", values["stars"]])
-		if values["wfwhm"]:
-			cli_args.extend(["-w", values["wfwhm"]])
-		if values["feather"]:
-			cli_args.extend(["-f", values["feather"]])
-		if values["drizzle"]:
-			cli_args.extend(["-z", values["drizzle"]])
-		if values["bkg_extract"]:
-			cli_args.append("-bg")
-		if values["platesolve"]:
-			cli_args.append("-ps")
-			if isinstance(values["platesolve"], str):
-				cli_args.append(values["platesolve"])
-		if values["no_calibration"]:
-			cli_args.append("-nc")
-		if values["multi"]:
-			cli_args.append("-m")
-			if isinstance(values["multi"], list):
-				cli_args.extend(values["multi"])
-			elif isinstance(values["multi"], str):
-				cli_args.append(values["multi"])
+		# a flag is passed for every set value, followed by the value unless it is a plain checkbox
+		for key, flag in PreprocessingDialog.CLI_FLAGS:
+			value = values[key]
+			if value:
+				cli_args.append(flag)
+				if isinstance(value, list):
+					cli_args.extend(value)
+				elif isinstance(value, str):
+					cli_args.append(value)
 
 		print(*cli_args)
-		main_logic(cli_args)
+		main_logic(cli_args, is_gui=True)
 
 		msg_box = QMessageBox()
 		msg_box.setIcon(QMessageBox.Icon.Information)
@@ -380,46 +500,57 @@ def run_gui():
 		msg_box.setWindowTitle("Success")
 		msg_box.exec()
 
-def main_logic(argv):
-	global args, workdir, bkg, stars, roundf, wfwhm, drizzle, drizzle_scale, feather, light_seq
-
-	parser = argparse.ArgumentParser()
-	parser.add_argument("-b", "--background", nargs='+', help="background filter settings, XX%% or X")
-	parser.add_argument("-bg", "--bkg", help="extract background", action="store_true")
-	parser.add_argument("-d", "--workdir", nargs='+', help="set working directory")
-	parser.add_argument("-f", "--feather", nargs='+', help="set feathering amount in px")
-	parser.add_argument("-m","--multi_session", nargs='+', help="Calibrates multiple sessions, provide working directory for each session")	
-	parser.add_argument("-nc", "--no_calibration", help="do not calibrate", action="store_true")
-	parser.add_argument("-ps", "--platesolve", nargs='?', const=True, help="platesolve, optionally provide focal lenght")
-	parser.add_argument("-r", "--round", nargs='+',	help="round filter settings, XX%% or X")
-	parser.add_argument("-s", "--stars", nargs='+', help="# of stars filter settings, XX%% or X")
-	parser.add_argument("-sr", "--satellite", help="satellite trail removal", action="store_true")	
-	parser.add_argument("-v","--version", help="print the version and exit",action="store_true")
-	parser.add_argument("-w", "--wfwhm", nargs='+',	help="wfwhm filter settings, XX%% or X")
-	parser.add_argument("-z", "--drizzle", nargs='+', help="set drizzle scaling, required for OSC images")
-	args = parser.parse_args(argv)
+# built once, main_logic may be called repeatedly from the GUI
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument("-b", "--background", help="background filter settings, XX%% or X")
+PARSER.add_argument("-bg", "--bkg", help="extract background", action="store_true")
+PARSER.add_argument("-d", "--workdir", help="set working directory")
+PARSER.add_argument("-f", "--feather", help="set feathering amount in px")
+PARSER.add_argument("-m","--multi_session", nargs='+', help="Calibrates multiple sessions, provide working directory for each session")	
+PARSER.add_argument("-nc", "--no_calibration", help="do not calibrate", action="store_true")
+PARSER.add_argument("-ps", "--platesolve", nargs='?', const=True, help="platesolve, optionally provide focal lenght")
+PARSER.add_argument("-r", "--round",	help="round filter settings, XX%% or X")
+PARSER.add_argument("-s", "--stars", help="# of stars filter settings, XX%% or X")
+PARSER.add_argument("-sr", "--satellite", help="satellite trail removal", action="store_true")	
+PARSER.add_argument("-v","--version", help="print the version and exit",action="store_true")
+PARSER.add_argument("-w", "--wfwhm",	help="wfwhm filter settings, XX%% or X")
+PARSER.add_argument("-z", "--drizzle", help="set drizzle scaling, required for OSC images")
+
+def main_logic(argv, is_gui=False):
+	global connected, args, workdir, bkg, stars, roundf, wfwhm, drizzle, drizzle_scale, feather, light_seq, siril_cwd, stack_out
+
+	args = PARSER.parse_args(argv)
 
 	if args.version:
 		print('version ' + VERSION)
 		sys.exit(1)
 
-	bkg = (args.background[0]) if args.background else '100%'
-	stars = (args.stars[0]) if args.stars else '100%'
-	roundf = (args.round[0]) if args.round else '100%'
-	wfwhm = (args.wfwhm[0]) if args.wfwhm else '100%'
-	if args.drizzle:
-		drizzle_scale = args.drizzle[0]
-		pix_frac = str(1 / float(drizzle_scale))
-		drizzle = f"-kernel=square -drizzle -scale={drizzle_scale} -pixfrac={pix_frac}"
-	else:
-		drizzle, drizzle_scale = " ", 0
-	feather = args.feather[0] if args.feather else '0'
-
 	try:
-		siril.connect()
+		bkg = args.background or '100%'
+		stars = args.stars or '100%'
+		roundf = args.round or '100%'
+		wfwhm = args.wfwhm or '100%'
+		# fail before any calibration work is done
+		for name, value in (('background', bkg), ('stars', stars), ('round', roundf), ('wfwhm', wfwhm)):
+			if not FILTER_RE.match(value):
+				raise ArgError(f"{name} filter needs to be XX% or X, got {value}")
+		if args.drizzle:
+			drizzle_scale = args.drizzle
+			pix_frac = format(1 / float(drizzle_scale), 'g')
+			drizzle = f"-kernel=square -drizzle -scale={drizzle_scale} -pixfrac={pix_frac}"
+		else:
+			drizzle, drizzle_scale = " ", 0
+		feather = args.feather or '0'
+		# result name records the settings, only the object is filled in when stacking
+		stack_out = f"{{obj}}_b{bkg}-s{stars}-r{roundf}-w{wfwhm}-z{drizzle_scale}-f{feather}-$LIVETIME:%d$s"
+
+		if not connected:
+			siril.connect()
+			connected = True
 		siril.cmd("requires", "1.3.6")
 		siril.log("Running preprocessing")
-		workdir = args.workdir[0] if args.workdir else os.getcwd()
+		siril_cwd = None
+		workdir = os.path.realpath(args.workdir or CWD)
 		# handle working directory with spaces
 		olddir = None
 		if ' ' in os.path.basename(workdir):
@@ -427,78 +558,66 @@ def main_logic(argv):
 			workdir = workdir.replace(" ", "_")
 			os.rename(olddir, workdir)
 
-		siril.cmd("cd", workdir)
+		cd(workdir)
 		process_dir = os.path.join(workdir, 'process')
 		siril.cmd("set32bits")
 		siril.cmd("setext", "fit")
 
 		if args.no_calibration:
-			light_nc(os.path.join(workdir, 'lights'), process_dir)
+			light_nc(os.path.join(workdir, 'lights'), process_dir, process_files(process_dir))
 
 		elif args.multi_session:
-			w = 0
-			n = len (args.multi_session)
-			while n > w:
-				workdir = args.multi_session[w]
-				if not os.path.exists(workdir):
-					print (f"Directory {workdir} not found")
-					sys.exit(1)
-				w +=1
-			w = 0
-			while n > w:
-				workdir = args.multi_session[w]
+			# check every session up front, not after the first ones are calibrated
+			missing = [d for d in args.multi_session if not os.path.isdir(d)]
+			if missing:
+				raise ArgError(f"Directories not found: {', '.join(missing)}")
+			for w, workdir in enumerate(args.multi_session):
 				if args.satellite:
 					satellite_removal(workdir)
 				process_dir = os.path.join(workdir, 'process')
-				master_bias(os.path.join(workdir, 'biases'), process_dir)
-				master_flat(os.path.join(workdir, 'flats'), process_dir)
-				master_dark(os.path.join(workdir, 'darks'), process_dir)
-				light(os.path.join(workdir, 'lights'), process_dir)
+				existing = process_files(process_dir)
+				master_bias(os.path.join(workdir, 'biases'), process_dir, existing)
+				master_flat(os.path.join(workdir, 'flats'), process_dir, existing)
+				master_dark(os.path.join(workdir, 'darks'), process_dir, existing)
+				light(os.path.join(workdir, 'lights'), process_dir, existing)
 				if w > 0:
-					# find highest pp_light in 1st working directory/process
-					for pp in os.listdir(os.path.join(args.multi_session[0], 'process')):
-						if pp.startswith('pp_light_') and pp.endswith('.fit'):
-							next = int(pp.split('_')[-1].split('.')[0])
-					next += 1
-					print(f"pp_light_{next}.fit")
-					for pp in os.listdir(process_dir):
-						if pp.startswith('pp_light_') and pp.endswith('.fit'):
-							new = f"pp_light_{next:05}.fit"
-							oldpath = os.path.join(args.multi_session[w], 'process', pp)
-							newpath = os.path.join(args.multi_session[0], 'process', new)
-							os.rename(oldpath, newpath)
-							next += 1
-				w +=1
+					renumber_lights(process_dir, os.path.join(args.multi_session[0], 'process'))
 			workdir = args.multi_session[0]
 			process_dir = os.path.join(workdir, 'process')
 		else:
 			if args.satellite:
 				satellite_removal(workdir)
-			master_bias(os.path.join(workdir, 'biases'), process_dir)
-			master_flat(os.path.join(workdir, 'flats'), process_dir)
-			master_dark(os.path.join(workdir, 'darks'), process_dir)
-			light(os.path.join(workdir, 'lights'), process_dir)
+			existing = process_files(process_dir)
+			master_bias(os.path.join(workdir, 'biases'), process_dir, existing)
+			master_flat(os.path.join(workdir, 'flats'), process_dir, existing)
+			master_dark(os.path.join(workdir, 'darks'), process_dir, existing)
+			light(os.path.join(workdir, 'lights'), process_dir, existing)
 
+		existing = process_files(process_dir)
 		if args.bkg:
-			bkg_extract(process_dir)
+			bkg_extract(process_dir, existing)
 			light_seq = 'bkg_pp_light'
 		else:
 			light_seq = 'pp_light'
 
-		if args.platesolve:
-			platesolve(process_dir)
-		register(process_dir)
-		stack(process_dir)
+		if stack_current(process_dir):
+			siril.log("Stack with the same frames and settings exists, skipping registration and stacking")
+		else:
+			if args.platesolve:
+				platesolve(process_dir, existing)
+			register(process_dir)
+			stack(process_dir)
 
 		if olddir:
 			os.rename(workdir, olddir)
-			siril.cmd("cd",f'"{olddir}"')
+			cd(olddir)
 		else:
-			siril.cmd("cd",f'"{workdir}"')
+			cd(workdir)
 
 	except Exception as e:
 		print("\n**** ERROR *** " + str(e) + "\n")
-		if 'QApplication' in globals() and QApplication.instance():
+		if is_gui:
+			from PyQt6.QtWidgets import QMessageBox
 			msg_box = QMessageBox()
 			msg_box.setIcon(QMessageBox.Icon.Critical)
 			msg_box.setText("An error occurred during processing.")
@@ -506,10 +625,18 @@ def main_logic(argv):
 			msg_box.setWindowTitle("Error")
 			msg_box.exec()
 
-if __name__ == '__main__':
+def main():
+	global siril
 	siril = s.SirilInterface()
 
-	if len(sys.argv) == 1:
-		run_gui()
-	else:
-		main_logic(sys.argv[1:])
+	try:
+		if len(sys.argv) == 1:
+			run_gui()
+		else:
+			main_logic(sys.argv[1:])
+	finally:
+		if connected:
+			siril.disconnect()
+
+if __name__ == '__main__':
+	main()
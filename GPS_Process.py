@@ -14,6 +14,12 @@ pyscript GPS_Process.py -d <workspace> -dc 0.5
 pyscript GPS_Process.py -d <workspace> -sc 0.5 0.5 5
 ---
 
+The same runs can be listed in a JSON file, one argument list per run, and started with a single pyscript call so the script only starts and connects to siril once
+---
+[["-d", "<workspace>", "-dc", "0.5"], ["-d", "<workspace>", "-sc", "0.5", "0.5", "5"]]
+---
+pyscript GPS_Process.py -B runs.json
+
 Processing for Siril
 from Graham Smith (2025, 2026)
 
@@ -30,220 +36,227 @@ SPDX-License-Identifier: GPL-3.0-or-later
 0.2.2   Add option to run synthstar on starmask and GUI improvements
 0.2.3   Add stride input for starnet
 0.2.4   Adds GUI to select SPCC sensors and filters
+0.2.5   Faster Cosmic Clarity staging and background extraction, adds options to compress processed images and batch runs
 """
 
 import sys
 import os
+import errno
 import subprocess
 import shutil
+from pathlib import Path
 import sirilpy as s
 import argparse
 import re
-
-VERSION = "0.2.3"
-
-# PyQt6 for GUI
-try:
-	from PyQt6.QtWidgets import (
-		QApplication, QComboBox, QDialog, QLabel, QLineEdit, QPushButton, QCheckBox, QToolTip, QScrollArea,
-		QVBoxLayout, QHBoxLayout, QFormLayout, QDialogButtonBox, QMessageBox, QFrame, QGroupBox, QWidget
-	)
-except ImportError:
-	# Silently fail if PyQt6 is not installed, as it's optional for CLI mode.
+import time
+import json
+
+VERSION = "0.2.5"
+
+COPY_BUFSIZE = 8 * 1024 * 1024
+FITS_EXTS = ('.fits', '.fit', '.fts', '.fz')
+PERCENT_RE = re.compile(rb"(\d+(?:\.\d+)?)%")
+# starting directory, read once so the GUI and command line defaults agree
+CWD = os.getcwd()
+# Cosmic Clarity names each result after its input with this added to the stem
+CC_OUTPUT_TAGS = {'denoise': '_denoised', 'sharpen': '_sharpened'}
+# the values each sharpen mode takes in order, the ones a mode leaves out are 0
+SHARPEN_CC_LAYOUT = {
+	'Both': ('stellar', 'non_stellar', 'strength'),
+	'Non-Stellar Only': ('non_stellar', 'strength'),
+	'Stellar Only': ('stellar',),
+}
+SHARPEN_SA_LAYOUT = {
+	'Both': ('stellar', 'non_stellar'),
+	'Non-Stellar Only': ('non_stellar',),
+	'Stellar Only': ('stellar',),
+}
+
+# a bad option value, reported through main_logic's error handling like any other failure
+class ArgError(ValueError):
 	pass
 
-original_images = []
-processed_images = []
+cc_paths = {}
+last_pct = -2.0
+last_time = 0.0
+
+original_images = frozenset()
+processed_images = set()
+connected = False
+
+DARK_STYLESHEET = """
+	QWidget {
+		background-color: #2b2b2b;
+		color: #efefef;
+	}
+	QLineEdit, QTextEdit, QComboBox {
+		background-color: #3b3b3b;
+		color: #efefef;
+		border: 1px solid #555;
+		padding: 2px;
+	}
+	QPushButton {
+		background-color: #4b4b4b;
+		color: #efefef;
+		border: 1px solid #555;
+		padding: 5px;
+		border-radius: 3px;
+	}
+	QPushButton:hover {
+		background-color: #5b5b5b;
+	}
+	QPushButton:pressed {
+		background-color: #3b3b3b;
+	}
+	QCheckBox {
+		spacing: 5px;
+	}
+	QCheckBox::indicator {
+		width: 15px;
+		height: 15px;
+		background-color: #3b3b3b;
+		border: 1px solid #555;
+	}
+	QCheckBox::indicator:checked {
+		background-color: #4b9ee3;
+	}
+"""
 
 # ==============================================================================
 # Prototype sirilpy processing script
 # ==============================================================================
 
 def abe(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting background extraction on " + image)
-			siril.cmd("load", image)
-			siril.cmd(f"pyscript AutoBGE.py -npoints {npoints} -polydegree {polydegree} -rbfsmooth {rbfsmooth}")
-			newimage = (f"{(image).rsplit('.', 1)[0]}_ab{npoints}-{polydegree}-{rbfsmooth}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	run_stage(workdir, "Starting background extraction on", "Background extraction", f"_ab{npoints}-{polydegree}-{rbfsmooth}",
+		[f"pyscript AutoBGE.py -npoints {npoints} -polydegree {polydegree} -rbfsmooth {rbfsmooth}"])
 
 def autostretch(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Auto stretching " + image)
-			siril.cmd("load", image)
-			siril.cmd("autostretch -linked")
-			newimage = (f"{os.path.splitext(image)[0]}_as")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	run_stage(workdir, "Auto stretching", "Autostretch", "_as", ["autostretch -linked"])
 
 def bkg(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting background extraction on " + image)
-			siril.cmd("load", image)
-			siril.cmd("subsky -rbf -samples=20 -tolerance=1.0 -smooth=" + smooth)
-			newimage = (f"{(image).rsplit('.', 1)[0]}_b{smooth}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	images = []
+	for image in pending_images(workdir, "Starting background extraction on"):
+		if output_current(workdir, image, f"{image_stem(image)}_b{smooth}"):
+			processed_images.add(image)
+		else:
+			images.append(image)
+	if not images:
+		return
+	seq_dir, results = run_sequence(workdir, images, "bkg", f"seqsubsky bkg -rbf -samples=20 -tolerance=1.0 -smooth={smooth}", "bkg_")
+	try:
+		for image in images:
+			path = results.get(image)
+			if path is None:
+				siril.log(f"Background extraction gave no result for {image}, it was not processed")
+				continue
+			newimage = f"{image_stem(image)}_b{smooth}{fits_ext(path)}"
+			fast_transfer(path, os.path.join(workdir, newimage))
+			processed_images.add(image)
+	finally:
+		shutil.rmtree(seq_dir, ignore_errors=True)
 			
 def bkg_GraX(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting GraXpert background extraction on " + image)			
-			siril.cmd("load", image)
-			siril.cmd("pyscript GraXpert-AI.py -bge -smoothing " + bkgGraX)
-			newimage = (f"{(image).rsplit('.', 1)[0]}_bg{bkgGraX}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	run_stage(workdir, "Starting GraXpert background extraction on", "GraXpert background extraction", f"_bg{bkgGraX}",
+		["pyscript GraXpert-AI.py -bge -smoothing " + bkgGraX])
 
 def crop(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			for c in args.crop:
-				siril.log(f"Cropping {image} by {c}%")			
-				siril.cmd("load", image)
-				x_crop = (float(siril.get_image_fits_header(return_as='dict')['NAXIS1']) * (float(c) / 100.0))
-				y_crop = (float(siril.get_image_fits_header(return_as='dict')['NAXIS2']) * (float(c) / 100.0))
-				x = (float(siril.get_image_fits_header(return_as='dict')['NAXIS1']) - (float(x_crop) * 2.0))			
-				y = (float(siril.get_image_fits_header(return_as='dict')['NAXIS2']) - (float(y_crop) * 2.0))
-				siril.cmd(f"crop {x_crop} {y_crop} {x} {y}")
-				newimage = (f"{(image).rsplit('.', 1)[0]}_c{c}")
-				siril.cmd("save", newimage)
-				processed_images.append(f"{image}")				
-
-def denoise(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting denoise on " + image)
+	images = pending_images(workdir, "Cropping")
+	for i, image in enumerate(images):
+		siril.update_progress("Crop", i / len(images))
+		width = None
+		for c in args.crop:
 			siril.cmd("load", image)
-			siril.cmd("denoise -indep -vst")
-			newimage = (f"{os.path.splitext(image)[0]}_d")
+			# every crop starts from the same image, fetch its size once
+			if width is None:
+				header = siril.get_image_fits_header(return_as='dict')
+				width, height = float(header['NAXIS1']), float(header['NAXIS2'])
+			x_crop = width * (float(c) / 100.0)
+			y_crop = height * (float(c) / 100.0)
+			x = width - x_crop * 2.0
+			y = height - y_crop * 2.0
+			siril.cmd(f"crop {x_crop} {y_crop} {x} {y}")
+			newimage = f"{image_stem(image)}_c{c}"
 			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+			processed_images.add(image)				
+
+def denoise(workdir):
+	run_stage(workdir, "Starting denoise on", "Denoise", "_d", ["denoise -indep -vst"])
 
 def denoise_CC(workdir):
-	compress = (siril.get_siril_config('compression','enabled'))
-	config_dir = siril.get_siril_configdir()
-	if os.path.isfile (f"{config_dir}/sirilcc_denoise.conf"):
-		config_file_path = (f"{config_dir}/sirilcc_denoise.conf")
-		with open(config_file_path, 'r') as file:
-			executable_path = file.readline().strip()
-			cc_input_dir = (executable_path.rsplit('/', 1)[0])+"/input"
-			cc_output_dir = (executable_path.rsplit('/', 1)[0])+"/output"
-	else:
-		print("Executable not yet configured. It is recommended to use Seti Astro Cosmic Clarity v5.4 or higher.")
-		sys.exit(1)
+	options = ["--denoise_mode", f"{denoiseCC_mode}", "--denoise_strength", f"{denoiseCC_strength}", "--separate_channels"]
+	run_cosmic_clarity(workdir, "denoise", options, "Denoise:", f"_dc{denoiseCC_mode}{denoiseCC_strength}.fit")
 
-	os.chdir(cc_input_dir)
-	for oldimage in os.listdir():
-		os.remove(oldimage)
-	os.chdir(workdir)
-
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log(image)
-			# CosmicClaritySuite does not support compressed fit files
-			if image.endswith(('.fz')):
-				if compress:
-					siril.cmd("setcompress 0")
-				siril.cmd("load", image)
-				siril.cmd("save", image)
-				image = os.path.splitext(image)[0]
-				os.remove(f"{image}.fz")
-				if compress:
-					siril.cmd("setcompress 1")
-			shutil.copy(image, cc_input_dir)			
-
-			cmd = f"{executable_path} --denoise_mode {denoiseCC_mode} --denoise_strength {denoiseCC_strength} --separate_channels"
-			process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-
-			percent_re = re.compile(r"(\d+\.?\d*)" + "%")
-			if process.stdout:			
-				for line in iter(process.stdout.readline, ''):
-					line = line.strip()
-					if not line:
-						continue
-					m = percent_re.search(line)
-					if m:
-						try:
-							pct = float(m.group(1))
-							siril.update_progress(f"Denoise:", pct / 100.0)
-						except ValueError:
-							siril.log(line)
-					else:
-							siril.log(line)
-			process.wait()
-		
-			os.chdir(cc_input_dir)
-			for oldimage in os.listdir():
-				os.remove(oldimage)
-			os.chdir(cc_output_dir)
-			for ccimage in os.listdir():
-				newimage = (f"{(image).rsplit('.', 1)[0]}_dc{denoiseCC_mode}{denoiseCC_strength}.fit")		
-				shutil.move(ccimage, (f"{workdir}/{newimage}"))
-				processed_images.append(f"{image}")		
-			os.chdir(workdir)
-	
 def denoise_GraX(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting GraXpert denoise on " + image)
-			siril.cmd("load", image)
-			siril.cmd("pyscript GraXpert-AI.py -gpu -denoise -strength " + denoiseGraX)
-			newimage = (f"{(image).rsplit('.', 1)[0]}_dg{denoiseGraX}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	run_stage(workdir, "Starting GraXpert denoise on", "GraXpert denoise", f"_dg{denoiseGraX}",
+		["pyscript GraXpert-AI.py -gpu -denoise -strength " + denoiseGraX])
 
 def denoise_SA(workdir):
 	os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 	config_dir = siril.get_siril_configdir()
-	if os.path.isfile (f"{config_dir}/sirilcc_saspro.conf"):
-		config_file_path = (f"{config_dir}/sirilcc_saspro.conf")
-		with open(config_file_path, 'r') as file:
-			executable_path = file.readline().strip()
-			python_path = executable_path.replace("setiastrosuitepro", "python")
-	else:
+	try:
+		executable_path = Path(f"{config_dir}/sirilcc_saspro.conf").read_text().split("\n", 1)[0].strip()
+	except FileNotFoundError:
 		print(f"Executable not configured. Please create file 'sirilcc_saspro.conf' in your siril config directory {config_dir} with a line containing the path to setiastrosuitepro.")
 		sys.exit(1)
+	python_path = executable_path.replace("setiastrosuitepro", "python")
 		
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log(image)
-			newimage = (f"{(image).rsplit('.', 1)[0]}_dsa-{denoiseSA_mode}-{denoiseSA_luma_amount}-{denoiseSA_color_amount}.fit")
-			cmd = [python_path, executable_path, "cc", "denoise", "--gpu", "--denoise-mode", f"{denoiseSA_mode}", "--denoise-luma", f"{denoiseSA_luma_amount}", "--denoise-color", f"{denoiseSA_color_amount}", "--separate-channels", "-i", f"{image}", "-o", f"{newimage}"]
-			print(" ".join(cmd))
-			
-			my_env = os.environ.copy()
-			my_env.pop("PYTHONPATH", None)
-			process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-
-			percent_re = re.compile(r"(\d+\.?\d*)" + "%")
-			if process.stdout:
-				for line in iter(process.stdout.readline, ''):
-					line = line.strip()
-					if not line:
-						continue
-					m = percent_re.search(line)
-					if m:
-						try:
-							pct = float(m.group(1))
-							siril.update_progress(f"Denoise", pct / 100.0)
-						except ValueError:
-							siril.log(line)
-					else:
-							siril.log(line)
-			process.wait()
-			processed_images.append(f"{image}")		
+	for image in pending_images(workdir, "Starting denoise on"):
+		newimage = f"{image_stem(image)}_dsa-{denoiseSA_mode}-{denoiseSA_luma_amount}-{denoiseSA_color_amount}.fit"
+		if output_current(workdir, image, newimage):
+			processed_images.add(image)
+			continue
+		cmd = [python_path, executable_path, "cc", "denoise", "--gpu", "--denoise-mode", f"{denoiseSA_mode}", "--denoise-luma", f"{denoiseSA_luma_amount}", "--denoise-color", f"{denoiseSA_color_amount}", "--separate-channels", "-i", os.path.join(workdir, image), "-o", os.path.join(workdir, newimage)]
+		print(" ".join(cmd))
+		
+		my_env = os.environ.copy()
+		my_env.pop("PYTHONPATH", None)
+		process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+		watch_progress(process, "Denoise", os.path.join(workdir, newimage))
+		processed_images.add(image)		
+
+def ensure_uncompressed(image, dst_dir):
+	# CosmicClaritySuite does not support compressed fit files, siril writes a plain copy
+	# straight into its input directory and the compressed original is left alone
+	siril.cmd("load", image)
+	siril.cmd("save", f'"{os.path.join(dst_dir, image_stem(image))}"')
+
+def fast_copy(src, dst):
+	# copy in large blocks, in kernel with sendfile where available
+	with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+		if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+			offset = 0
+			while True:
+				sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, COPY_BUFSIZE)
+				if sent == 0:
+					break
+				offset += sent
+		else:
+			shutil.copyfileobj(fsrc, fdst, length=COPY_BUFSIZE)
+	shutil.copystat(src, dst)
+
+def fast_transfer(src, dst):
+	# replace is a metadata only operation that also overwrites an existing
+	# target on every platform, only copy when crossing filesystems
+	try:
+		os.replace(src, dst)
+	except OSError as e:
+		if e.errno != errno.EXDEV:
+			raise
+		fast_copy(src, dst)
+		os.remove(src)
+
+def fits_ext(name):
+	root, ext = os.path.splitext(name)
+	if ext.lower() == '.fz':
+		ext = os.path.splitext(root)[1] + ext
+	return ext
+
+def fits_images(workdir):
+	# snapshot the listing, stages write new images into the directory they iterate
+	# sorted so every stage and every run handles the images in the same order
+	with os.scandir(workdir) as it:
+		return sorted(e.name for e in it if e.is_file(follow_symlinks=False) and e.name.lower().endswith(FITS_EXTS))
 
 def get_sensors_filters():
 		siril.connect()
@@ -274,224 +287,331 @@ def get_sensors_filters():
 		siril.disconnect()
 		return oscsensors, monosensors, oscfilters, redfilters, bluefilters, greenfilters
 			
+def image_stem(name):
+	ext = fits_ext(name)
+	return name[:-len(ext)] if ext else name
+
+def link_or_copy(src, dst):
+	# a symlink still avoids the copy across filesystems, windows may refuse both
+	try:
+		os.link(src, dst)
+	except OSError:
+		try:
+			os.symlink(os.path.abspath(src), dst)
+		except OSError:
+			fast_copy(src, dst)
+
+def load_cc_conf(kind):
+	# executable and its input/output dirs, read once per run
+	if kind not in cc_paths:
+		config_dir = siril.get_siril_configdir()
+		try:
+			executable_path = Path(f"{config_dir}/sirilcc_{kind}.conf").read_text().split("\n", 1)[0].strip()
+		except FileNotFoundError:
+			print("Executable not yet configured. It is recommended to use Seti Astro Cosmic Clarity v5.4 or higher.")
+			sys.exit(1)
+		cc_dir = os.path.dirname(executable_path)
+		cc_paths[kind] = (executable_path, os.path.join(cc_dir, "input"), os.path.join(cc_dir, "output"))
+	return cc_paths[kind]
+
+def log_progress(line, label):
+	global last_pct, last_time
+	line = line.strip()
+	if not line:
+		return
+	# lines stay as bytes, only the ones that are logged get decoded
+	m = PERCENT_RE.search(line) if b'%' in line else None
+	if m:
+		try:
+			pct = float(m.group(1))
+		except ValueError:
+			siril.log(line.decode('utf-8', errors='replace'))
+			return
+		# each update is a round trip to Siril, only send ones the user could see
+		now = time.monotonic()
+		if abs(pct - last_pct) >= 1.0 or now - last_time >= 0.1:
+			siril.update_progress(label, pct / 100.0)
+			last_pct, last_time = pct, now
+	else:
+		siril.log(line.decode('utf-8', errors='replace'))
+
 def multiprocess(workdir):
-	os.chdir(workdir)
-	base_directory = 'Processed_' 
-	index = 1
-	while True:
-	    path = f"{base_directory}{index}"
-	    if os.path.isdir(path):
-	        index += 1  # Increment the index for the next iteration
-	    else:
-	        os.makedirs(f"{base_directory}{index}")
-	        break
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in original_images:
-			shutil.move(image, (f"{workdir}/{base_directory}{index}"))
+	base_directory = 'Processed_'
+	# one listing finds the highest Processed_N, rather than probing each N in turn
+	with os.scandir(workdir) as it:
+		index = max((int(e.name[len(base_directory):]) for e in it
+			if e.is_dir() and e.name.startswith(base_directory) and e.name[len(base_directory):].isdigit()), default=0) + 1
+	path = os.path.join(workdir, f"{base_directory}{index}")
+	os.makedirs(path)
+	for image in fits_images(workdir):
+		if image not in original_images:
+			fast_transfer(os.path.join(workdir, image), os.path.join(path, image))
+
+def output_current(workdir, image, newimage):
+	# an earlier run already wrote this output and the input has not changed since
+	names = [newimage] if newimage.lower().endswith(FITS_EXTS) else [f"{newimage}.fit", f"{newimage}.fit.fz"]
+	mtime = os.stat(os.path.join(workdir, image)).st_mtime
+	for name in names:
+		try:
+			if os.stat(os.path.join(workdir, name)).st_mtime >= mtime:
+				return True
+		except FileNotFoundError:
+			pass
+	return False
+
+def pending_images(workdir, label):
+	# one log call per stage instead of one per image
+	images = [image for image in fits_images(workdir) if image not in processed_images]
+	if images:
+		siril.log(f"{label} {len(images)} images: {', '.join(images)}")
+	return images
 
 def pixelmath(workdir):
-	os.chdir(workdir)
 	combine_factor = (args.starnet[2])
-	for starmask in os.listdir():
+	for starmask in os.listdir(workdir):
 		if starmask.startswith("starmask"):
 			stars = starmask
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:	
+	for image in fits_images(workdir):
+		if image not in processed_images:
 			less = image
 	siril.cmd(f"PM '${less}$ + (${stars}$ * {combine_factor}) / 1 + ${less}$ * ${stars}$'")
-	newimage = f"{os.path.splitext(less.removeprefix('starless_'))[0]}_combined"
+	newimage = f"{image_stem(less.removeprefix('starless_'))}_combined"
 	siril.cmd("save", newimage)
-	processed_images.append(f"{newimage}")
+	processed_images.add(newimage)
+
+def reset_dir(path):
+	# remove whatever an earlier or failed run left behind in one call
+	if not os.path.lexists(path):
+		os.makedirs(path)
+	elif os.path.islink(path):
+		# removing a symlinked directory would only remove the link, empty its target instead
+		with os.scandir(path) as it:
+			for entry in it:
+				if entry.is_dir(follow_symlinks=False):
+					shutil.rmtree(entry.path)
+				else:
+					os.remove(entry.path)
+	else:
+		mode = os.stat(path).st_mode
+		shutil.rmtree(path)
+		os.mkdir(path)
+		os.chmod(path, mode & 0o7777)
+
+def run_cosmic_clarity(workdir, kind, options, label, suffix):
+	compress = siril.get_siril_config('compression','enabled')
+	executable_path, cc_input_dir, cc_output_dir = load_cc_conf(kind)
+	# outputs left by a failed run would otherwise be swept in with this one
+	reset_dir(cc_input_dir)
+	reset_dir(cc_output_dir)
+
+	# staging and collecting are only cheap renames and links on the same filesystem
+	if os.stat(cc_output_dir).st_dev != os.stat(workdir).st_dev:
+		siril.log(f"{label}: Cosmic Clarity is on a different filesystem to {workdir}, images will be copied in and out")
+
+	images = []
+	compress_off = False
+	try:
+		for image in pending_images(workdir, "Cosmic Clarity staging"):
+			if output_current(workdir, image, f"{image_stem(image)}{suffix}"):
+				processed_images.add(image)
+				continue
+			if image.lower().endswith('.fz'):
+				if compress and not compress_off:
+					siril.cmd("setcompress", "0")
+					compress_off = True
+				ensure_uncompressed(image, cc_input_dir)
+			else:
+				# a hardlink stages the image without moving any data, the original stays in place
+				link_or_copy(os.path.join(workdir, image), os.path.join(cc_input_dir, image))
+			images.append(image)
+	finally:
+		if compress_off:
+			siril.cmd("setcompress 1")
+	if not images:
+		return
+
+	# the executable processes everything in its input directory in one run
+	cmd = [executable_path] + options
+	print(" ".join(cmd))
+	process = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+	watch_progress(process, label)
+
+	reset_dir(cc_input_dir)
+
+	# each result has exactly the name cosmic clarity gives its input, so a stem that
+	# starts another image's stem cannot pick up that image's result
+	expected = {f"{image_stem(image)}{CC_OUTPUT_TAGS[kind]}": image for image in images}
+	with os.scandir(cc_output_dir) as it:
+		for entry in it:
+			image = expected.pop(image_stem(entry.name), None)
+			if image is None:
+				siril.log(f"{label} ignored unexpected output {entry.name}")
+				continue
+			fast_transfer(entry.path, os.path.join(workdir, f"{image_stem(image)}{suffix}"))
+			processed_images.add(image)
+	for image in expected.values():
+		siril.log(f"{label} no output for {image}, it was not processed")
+
+def run_sequence(workdir, images, seqname, command, prefix):
+	# link the images into a scratch directory as a sequence so one siril command processes them all
+	seq_dir = os.path.join(workdir, f"{seqname}_seq")
+	shutil.rmtree(seq_dir, ignore_errors=True)
+	os.makedirs(seq_dir)
+	for index, image in enumerate(images, 1):
+		link_or_copy(os.path.join(workdir, image), os.path.join(seq_dir, f"{index:05}{fits_ext(image)}"))
+	try:
+		siril.cmd("cd", f'"{seq_dir}"')
+		siril.cmd("convert", seqname)
+		siril.cmd(command)
+	except Exception:
+		# leave siril in the working directory and no scratch sequence behind
+		siril.cmd("cd", f'"{workdir}"')
+		shutil.rmtree(seq_dir, ignore_errors=True)
+		raise
+	siril.cmd("cd", f'"{workdir}"')
+
+	# map the numbered results back to the images they came from
+	results = {}
+	for entry in os.scandir(seq_dir):
+		if entry.name.startswith(f"{prefix}{seqname}_") and not entry.name.endswith('.seq'):
+			index = int(entry.name[len(prefix) + len(seqname) + 1:].split('.')[0])
+			results[images[index - 1]] = entry.path
+	return seq_dir, results
+
+def run_stage(workdir, label, progress, suffix, commands, reuse=True):
+	# load, run the stage's commands and save, for every image the stage has not seen yet
+	# reuse an earlier output only when the suffix records every setting of the stage
+	images = pending_images(workdir, label)
+	for i, image in enumerate(images):
+		siril.update_progress(progress, i / len(images))
+		newimage = f"{image_stem(image)}{suffix}"
+		if reuse and output_current(workdir, image, newimage):
+			processed_images.add(image)
+			continue
+		siril.cmd("load", image)
+		for command in commands:
+			siril.cmd(command)
+		siril.cmd("save", newimage)
+		processed_images.add(image)
 
 def sharpen(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting sharpen on " + image)
-			siril.cmd("load", image)
-			siril.cmd("rl -gdstep=0.0003 -iters=40 -alpha=3000 -tv")
-			siril.cmd("rl -gdstep=0.0002 -iters=40 -alpha=3000 -tv")
-			siril.cmd("rl -gdstep=0.0001 -iters=40 -alpha=3000 -tv")
-			newimage = (f"{os.path.splitext(image)[0]}_ss")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	# three passes with a shrinking gradient step
+	run_stage(workdir, "Starting sharpen on", "Sharpen", "_ss",
+		[f"rl -gdstep={gdstep} -iters=40 -alpha=3000 -tv" for gdstep in ("0.0003", "0.0002", "0.0001")])
 
 def sharpen_CC(workdir):
-	compress = (siril.get_siril_config('compression','enabled'))
-	config_dir = siril.get_siril_configdir()
-	if os.path.isfile (f"{config_dir}/sirilcc_sharpen.conf"):
-		config_file_path = (f"{config_dir}/sirilcc_sharpen.conf")
-		with open(config_file_path, 'r') as file:
-			executable_path = file.readline().strip()
-			cc_input_dir = (executable_path.rsplit('/', 1)[0])+"/input"
-			cc_output_dir = (executable_path.rsplit('/', 1)[0])+"/output"
-	else:
-		print("Executable not yet configured. It is recommended to use Seti Astro Cosmic Clarity v5.4 or higher.")
-		sys.exit(1)
-
-	os.chdir(cc_input_dir)
-	for image in os.listdir():
-		os.remove(image)
-	os.chdir(workdir)		
-
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log(image)
-			# CosmicClaritySuite does not support compressed fit files
-			if image.endswith(('.fz')):
-				if compress:
-					siril.cmd("setcompress 0")
-				siril.cmd("load", image)
-				siril.cmd("save", image)
-				image = os.path.splitext(image)[0]
-				os.remove(f"{image}.fz")
-				if compress:
-					siril.cmd("setcompress 1")
-			shutil.copy(image, cc_input_dir)
-			cmd = f"{executable_path} --sharpening_mode '{sharpenCC_mode}' --nonstellar_strength {sharpenCC_non_stellar_strength} --stellar_amount {sharpenCC_stellar_amount} --nonstellar_amount  {sharpenCC_non_stellar_amount} --auto_detect_psf"
-			print(cmd)
-			process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-
-			percent_re = re.compile(r"(\d+\.?\d*)" + "%")
-			if process.stdout:
-				for line in iter(process.stdout.readline, ''):
-					line = line.strip()
-					if not line:
-						continue
-					m = percent_re.search(line)
-					if m:
-						try:
-							pct = float(m.group(1))
-							siril.update_progress(f"Sharpen", pct / 100.0)
-						except ValueError:
-							siril.log(line)
-					else:
-							siril.log(line)
-			process.wait()
-
-			os.chdir(cc_input_dir)
-			for oldimage in os.listdir():
-				os.remove(oldimage)
-			os.chdir(cc_output_dir)
-			for ccimage in os.listdir():
-				newimage = (f"{(image).rsplit('.', 1)[0]}_sc{sharpenCC_mode}-{sharpenCC_non_stellar_strength}-{sharpenCC_stellar_amount}-{sharpenCC_non_stellar_amount}.fit")		
-				shutil.move(ccimage, (f"{workdir}/{newimage}"))
-				processed_images.append(f"{image}")		
-			os.chdir(workdir)
+	options = ["--sharpening_mode", f"{sharpenCC_mode}", "--nonstellar_strength", f"{sharpenCC_non_stellar_strength}", "--stellar_amount", f"{sharpenCC_stellar_amount}", "--nonstellar_amount", f"{sharpenCC_non_stellar_amount}", "--auto_detect_psf"]
+	run_cosmic_clarity(workdir, "sharpen", options, "Sharpen", f"_sc{sharpenCC_mode}-{sharpenCC_non_stellar_strength}-{sharpenCC_stellar_amount}-{sharpenCC_non_stellar_amount}.fit")
 
 def sharpen_SA(workdir):
 	os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 	config_dir = siril.get_siril_configdir()
-	if os.path.isfile (f"{config_dir}/sirilcc_saspro.conf"):
-		config_file_path = (f"{config_dir}/sirilcc_saspro.conf")
-		with open(config_file_path, 'r') as file:
-			executable_path = file.readline().strip()
-			python_path = executable_path.replace("setiastrosuitepro", "python")
-	else:
+	try:
+		executable_path = Path(f"{config_dir}/sirilcc_saspro.conf").read_text().split("\n", 1)[0].strip()
+	except FileNotFoundError:
 		print(f"Executable not configured. Please create file 'sirilcc_saspro.conf' in your siril config directory {config_dir} with a line containing the path to setiastrosuitepro.")
 		sys.exit(1)
+	python_path = executable_path.replace("setiastrosuitepro", "python")
+		
+	for image in pending_images(workdir, "Starting sharpen on"):
+		newimage = f"{image_stem(image)}_ssa-{sharpenSA_mode.rsplit( )[0]}-{sharpenSA_non_stellar_amount}-{sharpenSA_stellar_amount}.fit"
+		if output_current(workdir, image, newimage):
+			processed_images.add(image)
+			continue
+		cmd = [python_path, executable_path, "cc", "sharpen", "--gpu", "--sharpening-mode", f"{sharpenSA_mode}", "--nonstellar-amount", f"{sharpenSA_non_stellar_amount}", "--stellar-amount", f"{sharpenSA_stellar_amount}", "--auto-psf", "-i", os.path.join(workdir, image), "-o", os.path.join(workdir, newimage)]
+		print(" ".join(cmd))
+		
+		my_env = os.environ.copy()
+		my_env.pop("PYTHONPATH", None)
+		process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+		watch_progress(process, "Sharpen", os.path.join(workdir, newimage))
+		processed_images.add(image)		
 		
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log(image)
-			newimage = (f"{(image).rsplit('.', 1)[0]}_ssa-{sharpenSA_mode.rsplit( )[0]}-{sharpenSA_non_stellar_amount}-{sharpenSA_stellar_amount}.fit")
-			cmd = [python_path, executable_path, "cc", "sharpen", "--gpu", "--sharpening-mode", f"{sharpenSA_mode}", "--nonstellar-amount", f"{sharpenSA_non_stellar_amount}", "--stellar-amount", f"{sharpenSA_stellar_amount}", "--auto-psf", "-i", f"{image}", "-o", f"{newimage}"]
-			print(" ".join(cmd))
-			
-			my_env = os.environ.copy()
-			my_env.pop("PYTHONPATH", None)
-			process = subprocess.Popen(cmd, shell=False, env=my_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
-
-			percent_re = re.compile(r"(\d+\.?\d*)" + "%")
-			if process.stdout:
-				for line in iter(process.stdout.readline, ''):
-					line = line.strip()
-					if not line:
-						continue
-					m = percent_re.search(line)
-					if m:
-						try:
-							pct = float(m.group(1))
-							siril.update_progress(f"Sharpen", pct / 100.0)
-						except ValueError:
-							siril.log(line)
-					else:
-							siril.log(line)
-			process.wait()
-			processed_images.append(f"{image}")		
-			
 def sharpen_GraX(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting GraXpert sharpen on " + image)
-			siril.cmd("load", image)
-			if sharpenGraX_mode == "both":
-				siril.cmd("pyscript GraXpert-AI.py -gpu -deconv_obj -strength " + sharpenGraX_strength)
-				siril.cmd("pyscript GraXpert-AI.py -gpu -deconv_stellar -strength " + sharpenGraX_strength)
-			if sharpenGraX_mode == "object":
-				siril.cmd("pyscript GraXpert-AI.py -gpu -deconv_obj -strength " + sharpenGraX_strength)			
-			if sharpenGraX_mode == "stellar":
-				siril.cmd("pyscript GraXpert-AI.py -gpu -deconv_stellar -strength " + sharpenGraX_strength)			
-			newimage = (f"{(image).rsplit('.', 1)[0]}_sg{sharpenGraX_mode}{sharpenGraX_strength}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")
+	commands = []
+	if sharpenGraX_mode in ("both", "object"):
+		commands.append("pyscript GraXpert-AI.py -gpu -deconv_obj -strength " + sharpenGraX_strength)
+	if sharpenGraX_mode in ("both", "stellar"):
+		commands.append("pyscript GraXpert-AI.py -gpu -deconv_stellar -strength " + sharpenGraX_strength)
+	run_stage(workdir, "Starting GraXpert sharpen on", "GraXpert sharpen", f"_sg{sharpenGraX_mode}{sharpenGraX_strength}", commands)
+
+def show_error(e, is_gui):
+	print("\n**** ERROR *** " + str(e) + "\n")
+	if is_gui:
+		from PyQt6.QtWidgets import QMessageBox
+		msg_box = QMessageBox()
+		msg_box.setIcon(QMessageBox.Icon.Critical)
+		msg_box.setText("An error occurred during processing.")
+		msg_box.setInformativeText(str(e))
+		msg_box.setWindowTitle("Error")
+		msg_box.exec()
 
 def spcc(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Starting SPCC on " + image)
-			siril.cmd("load", image)			
-			siril.cmd("platesolve")
-			if Type == 'OSC':
-				print(f'spcc \"-oscsensor={spcc_sensor}\" \"-oscfilter={spcc_oscfilter}\"')
-				siril.cmd(f'spcc \"-oscsensor={spcc_sensor}\" \"-oscfilter={spcc_oscfilter}\"')
-			if Type == 'mono':
-				siril.cmd(f'spcc \"-monosensor={spcc_sensor}\" \"-rfilter={spcc_rfilter}\" \"-gfilter={spcc_gfilter}\" \"-bfilter={spcc_bfilter}\"')
-			newimage = (f"{os.path.splitext(image)[0]}_spcc")
-			siril.cmd("save", newimage)
-#			os.remove(image)
-			processed_images.append(f"{image}")
+	commands = ["platesolve"]
+	if Type == 'OSC':
+		print(f'spcc \"-oscsensor={spcc_sensor}\" \"-oscfilter={spcc_oscfilter}\"')
+		commands.append(f'spcc \"-oscsensor={spcc_sensor}\" \"-oscfilter={spcc_oscfilter}\"')
+	if Type == 'mono':
+		commands.append(f'spcc \"-monosensor={spcc_sensor}\" \"-rfilter={spcc_rfilter}\" \"-gfilter={spcc_gfilter}\" \"-bfilter={spcc_bfilter}\"')
+	# _spcc does not record the sensor and filters, so always calibrate again
+	run_stage(workdir, "Starting SPCC on", "SPCC", "_spcc", commands, reuse=False)
 
 def starnet(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Running starnet on " + image)
-			siril.cmd("load", image)
-			if args.starnet[0] == 2:
-				upscale = '-upscale'
-			elif args.starnet[0] == 1:
-				upscale = ''
-			else:
-				print("Upscale factor needs to be a 1 or 2")
-				sys.exit(1)
-			stride = int(args.starnet[1])
-			siril.cmd(f"starnet -stretch {upscale} -stride={stride}")
-			for starmask in os.listdir():
-				if starmask.startswith("starmask"):
-					siril.cmd("load", starmask)
-					if args.synthstar:
-						siril.cmd("synthstar")
-					siril.cmd("gauss 1.2")
-					siril.cmd("save", starmask)
-					processed_images.append(f"{starmask}")
-			processed_images.append(f"{image}")
+	# the upscale factor is checked in main_logic before any stage runs
+	upscale = '-upscale' if args.starnet[0] == 2 else ''
+	stride = int(args.starnet[1])
+	images = pending_images(workdir, "Running starnet on")
+	for i, image in enumerate(images):
+		siril.update_progress("Starnet", i / len(images))
+		siril.cmd("load", image)
+		siril.cmd(f"starnet -stretch {upscale} -stride={stride}")
+		for starmask in os.listdir(workdir):
+			if starmask.startswith("starmask"):
+				siril.cmd("load", starmask)
+				if args.synthstar:
+					siril.cmd("synthstar")
+				siril.cmd("gauss 1.2")
+				siril.cmd("save", starmask)
+				processed_images.add(starmask)
+		processed_images.add(image)
 
 def statstretch(workdir):
-	os.chdir(workdir)
-	for image in os.listdir():
-		if image.endswith(('.fits', '.fit', '.fts', '.fz')) and image not in processed_images:
-			siril.log("Stretching " + image)
-			siril.cmd("load", image)
-			siril.cmd(f"pyscript Statistical_Stretch.py -linked -normalize -hdr -hdramount {stretch_hdr_amount} -hdrknee {stretch_hdr_knee} -boost {stretch_boost_amount}")
-			newimage = (f"{os.path.splitext(image)[0]}_ss{stretch_hdr_amount}-{stretch_hdr_knee}-{stretch_boost_amount}")
-			siril.cmd("save", newimage)
-			processed_images.append(f"{image}")			
+	run_stage(workdir, "Stretching", "Statistical stretch", f"_ss{stretch_hdr_amount}-{stretch_hdr_knee}-{stretch_boost_amount}",
+		[f"pyscript Statistical_Stretch.py -linked -normalize -hdr -hdramount {stretch_hdr_amount} -hdrknee {stretch_hdr_knee} -boost {stretch_boost_amount}"])
+
+def watch_progress(process, label, output=None):
+	# read whatever output is available in one call rather than a line at a time
+	fd = process.stdout.fileno()
+	buf = b""
+	while True:
+		chunk = os.read(fd, 65536)
+		if not chunk:
+			break
+		buf += chunk
+		# progress bars redraw with a carriage return, treat it as a line end too
+		*lines, buf = buf.replace(b"\r", b"\n").split(b"\n")
+		for line in lines:
+			log_progress(line, label)
+	log_progress(buf, label)
+	if process.wait():
+		# a partial output would be newer than its input and taken as done by the next run
+		if output:
+			try:
+				os.remove(output)
+			except FileNotFoundError:
+				pass
+		raise RuntimeError(f"{label} exited with code {process.returncode}")
 
 def run_gui():
-	if 'QApplication' not in globals():
+	# PyQt6 is optional and only needed here, so the CLI never loads it
+	try:
+		from PyQt6.QtWidgets import (
+			QApplication, QComboBox, QDialog, QLabel, QLineEdit, QPushButton, QCheckBox, QToolTip, QScrollArea,
+			QVBoxLayout, QHBoxLayout, QFormLayout, QDialogButtonBox, QMessageBox, QFrame, QGroupBox, QWidget
+		)
+	except ImportError:
 		print("PyQt6 is not installed. Please install it to use the GUI.")
 		print("pip install PyQt6")
 		return
@@ -508,7 +628,7 @@ def run_gui():
 			# --- Working Directory (Top) ---
 			dir_group = QGroupBox()
 			dir_form = QFormLayout(dir_group)
-			self.workdir_input = QLineEdit(os.getcwd())
+			self.workdir_input = QLineEdit(CWD)
 			self.workdir_input.setToolTip("All fit(s) files in working directory will be processed")
 			dir_form.addRow("Working Directory:", self.workdir_input)
 			main_layout.addWidget(dir_group)
@@ -530,126 +650,74 @@ def run_gui():
 				checkbox.setFixedWidth(200)
 				form.addRow(checkbox, layout)
 
+			def add_stage_row(form, checkbox, fields, link=True):
+				# fields are (label, widget, width), they stay disabled until the checkbox is ticked
+				layout = QHBoxLayout()
+				layout.setSpacing(10)
+				for text, widget, width in fields:
+					if width:
+						widget.setFixedWidth(width)
+					widget.setEnabled(False)
+					if link:
+						checkbox.toggled.connect(widget.setEnabled)
+					if text:
+						layout.addWidget(create_aligned_label(text))
+					layout.addWidget(widget)
+				layout.addStretch()
+				add_aligned_row(form, checkbox, layout)
+
 			# --- 1. Basic Setup Group ---
 			basic_group = QGroupBox("1. Crop, Star processing and/or Background Extraction")
 			basic_form = QFormLayout(basic_group)
 
 			self.crop_cb = QCheckBox("Crop image")
 			self.crop_value = QLineEdit("1")
-			self.crop_value.setFixedWidth(40)
 			self.crop_value.setToolTip("Provide one or more crop percentage(s)")
-			self.crop_value.setEnabled(False)
-			self.crop_cb.toggled.connect(self.crop_value.setEnabled)
-			crop_layout = QHBoxLayout()
-			crop_layout.setSpacing(10)
-			crop_layout.addWidget(create_aligned_label("%(s)"))
-			crop_layout.addWidget(self.crop_value)
-			crop_layout.addStretch()
-			add_aligned_row(basic_form, self.crop_cb, crop_layout)
+			add_stage_row(basic_form, self.crop_cb, [("%(s)", self.crop_value, 40)])
 
 			self.starnet_cb = QCheckBox("Starnet")
 			self.scale_factor = QLineEdit("1")
-			self.scale_factor.setFixedWidth(40)
-			self.scale_factor.setEnabled(False)
 			self.stride = QLineEdit("256")
-			self.stride.setFixedWidth(40)
-			self.stride.setEnabled(False)
 			self.combine_factor = QLineEdit("0.5")
-			self.combine_factor.setFixedWidth(40)
-			self.combine_factor.setEnabled(False)
 			self.synthstar_cb = QCheckBox("Synthstar")
-			self.synthstar_cb.setEnabled(False)
-			self.starnet_cb.toggled.connect(self.scale_factor.setEnabled)
-			self.starnet_cb.toggled.connect(self.stride.setEnabled)
-			self.starnet_cb.toggled.connect(self.combine_factor.setEnabled)
-			self.starnet_cb.toggled.connect(self.synthstar_cb.setEnabled)
-			starnet_layout = QHBoxLayout()
-			starnet_layout.setSpacing(10)
-			starnet_layout.addWidget(create_aligned_label("Scale"))
-			starnet_layout.addWidget(self.scale_factor)
-			starnet_layout.addWidget(create_aligned_label("Stride"))
-			starnet_layout.addWidget(self.stride)
-			starnet_layout.addWidget(create_aligned_label("Star factor:"))
-			starnet_layout.addWidget(self.combine_factor)
-			starnet_layout.addWidget(self.synthstar_cb)
-			starnet_layout.addStretch()
-			add_aligned_row(basic_form, self.starnet_cb, starnet_layout)
+			add_stage_row(basic_form, self.starnet_cb, [
+				("Scale", self.scale_factor, 40),
+				("Stride", self.stride, 40),
+				("Star factor:", self.combine_factor, 40),
+				(None, self.synthstar_cb, None)])
 
 			self.abe_cb = QCheckBox("Auto Bkg Extraction")
 			self.abe_npoints = QLineEdit("100")
 			self.abe_polydegree = QLineEdit("2")
 			self.abe_rbfsmooth = QLineEdit("0.1")
-			self.abe_npoints.setFixedWidth(40)
-			self.abe_npoints.setEnabled(False)
-			for w in [self.abe_polydegree, self.abe_rbfsmooth]:
-				w.setFixedWidth(40)
-				w.setEnabled(False)
-			self.abe_cb.toggled.connect(self.abe_npoints.setEnabled)
-			self.abe_cb.toggled.connect(self.abe_polydegree.setEnabled)
-			self.abe_cb.toggled.connect(self.abe_rbfsmooth.setEnabled)
-			abe_layout = QHBoxLayout()
-			abe_layout.setSpacing(10)
-			abe_layout.addWidget(create_aligned_label("Npoints"))
-			abe_layout.addWidget(self.abe_npoints)
-			abe_layout.addWidget(create_aligned_label("Polydegree"))
-			abe_layout.addWidget(self.abe_polydegree)
-			abe_layout.addWidget(create_aligned_label("Rbfsmooth"))
-			abe_layout.addWidget(self.abe_rbfsmooth)
-			abe_layout.addStretch()
-			add_aligned_row(basic_form, self.abe_cb, abe_layout)
+			add_stage_row(basic_form, self.abe_cb, [
+				("Npoints", self.abe_npoints, 40),
+				("Polydegree", self.abe_polydegree, 40),
+				("Rbfsmooth", self.abe_rbfsmooth, 40)])
 			
 			self.bkg_cb = QCheckBox("Siril Bkg Extraction")
 			self.bkg_smooth = QLineEdit("0.5")
-			self.bkg_smooth.setFixedWidth(40)
-			self.bkg_smooth.setEnabled(False)
-			self.bkg_cb.toggled.connect(self.bkg_smooth.setEnabled)
-			bkg_layout = QHBoxLayout()
-			bkg_layout.setSpacing(10)
-			bkg_layout.addWidget(create_aligned_label("Smoothing"))
-			bkg_layout.addWidget(self.bkg_smooth)
-			bkg_layout.addStretch()
-			add_aligned_row(basic_form, self.bkg_cb, bkg_layout)
+			add_stage_row(basic_form, self.bkg_cb, [("Smoothing", self.bkg_smooth, 40)])
 
 			self.bkg_grax_cb = QCheckBox("GraXpert Bkg Extraction")
 			self.bkg_grax_smooth = QLineEdit("0.5")
-			self.bkg_grax_smooth.setFixedWidth(40)
-			self.bkg_grax_smooth.setEnabled(False)
-			self.bkg_grax_cb.toggled.connect(self.bkg_grax_smooth.setEnabled)
-			bkg_grax_layout = QHBoxLayout()
-			bkg_grax_layout.setSpacing(10)
-			bkg_grax_layout.addWidget(create_aligned_label("Smoothing"))
-			bkg_grax_layout.addWidget(self.bkg_grax_smooth)
-			bkg_grax_layout.addStretch()
-			add_aligned_row(basic_form, self.bkg_grax_cb, bkg_grax_layout)
+			add_stage_row(basic_form, self.bkg_grax_cb, [("Smoothing", self.bkg_grax_smooth, 40)])
 
+			# spcc enables its widgets itself so it can fill the sensor and filter lists
 			self.spcc_cb = QCheckBox("SPCC")
 			self.spcc_sensor = QComboBox()
-			self.spcc_sensor.setFixedWidth(80)
 			self.osc_cb = QCheckBox("OSC")
 			self.spcc_filter1 = QComboBox()
-			self.spcc_filter1.setFixedWidth(80)
 			self.spcc_filter2 = QComboBox()
-			self.spcc_filter2.setFixedWidth(80)
 			self.spcc_filter3 = QComboBox()
-			self.spcc_filter3.setFixedWidth(80)
-			self.spcc_sensor.setEnabled(False)
-			self.osc_cb.setEnabled(False)
-			self.spcc_filter1.setEnabled(False)
-			self.spcc_filter2.setEnabled(False)	
-			self.spcc_filter3.setEnabled(False)
+			add_stage_row(basic_form, self.spcc_cb, [
+				("Sensor:", self.spcc_sensor, 80),
+				(None, self.osc_cb, None),
+				("Filter(s):", self.spcc_filter1, 80),
+				(None, self.spcc_filter2, 80),
+				(None, self.spcc_filter3, 80)], link=False)
 			self.spcc_cb.toggled.connect(self.on_spcc_toggled)
 			self.osc_cb.toggled.connect(lambda: self.on_spcc_toggled(self.spcc_cb.isChecked()))
-			spcc_layout = QHBoxLayout()
-			spcc_layout.setSpacing(10)
-			spcc_layout.addWidget(create_aligned_label("Sensor:"))
-			spcc_layout.addWidget(self.spcc_sensor)
-			spcc_layout.addWidget(self.osc_cb)
-			spcc_layout.addWidget(create_aligned_label("Filter(s):"))
-			spcc_layout.addWidget(self.spcc_filter1)
-			spcc_layout.addWidget(self.spcc_filter2)	
-			spcc_layout.addWidget(self.spcc_filter3)					
-			spcc_layout.addStretch()
-			add_aligned_row(basic_form, self.spcc_cb, spcc_layout)
 
 			scroll_layout.addWidget(basic_group)
 
@@ -666,73 +734,31 @@ def run_gui():
 			self.sharpen_cc_stellar_amount = QLineEdit("0.5")
 			self.sharpen_cc_non_stellar_amount = QLineEdit("0.5")
 			self.sharpen_cc_non_stellar_strength = QLineEdit("5")
-			self.sharpen_cc_mode.setFixedWidth(80)
-			self.sharpen_cc_mode.setEnabled(False)
-			for w in [self.sharpen_cc_stellar_amount, self.sharpen_cc_non_stellar_amount, self.sharpen_cc_non_stellar_strength]:
-				w.setFixedWidth(40)
-				w.setEnabled(False)
-			self.sharpen_cc_cb.toggled.connect(self.sharpen_cc_mode.setEnabled)
-			self.sharpen_cc_cb.toggled.connect(self.sharpen_cc_stellar_amount.setEnabled)
-			self.sharpen_cc_cb.toggled.connect(self.sharpen_cc_non_stellar_amount.setEnabled)
-			self.sharpen_cc_cb.toggled.connect(self.sharpen_cc_non_stellar_strength.setEnabled)
+			add_stage_row(sharpen_form, self.sharpen_cc_cb, [
+				("Mode", self.sharpen_cc_mode, 80),
+				("Stellar", self.sharpen_cc_stellar_amount, 40),
+				("Non-Stellar", self.sharpen_cc_non_stellar_amount, 40),
+				("Strength", self.sharpen_cc_non_stellar_strength, 40)])
 			self.sharpen_cc_mode.currentTextChanged.connect(self.update_sharpen_cc_options)
-			sharpen_cc_layout = QHBoxLayout()
-			sharpen_cc_layout.setSpacing(10)
-			sharpen_cc_layout.addWidget(create_aligned_label("Mode"))
-			sharpen_cc_layout.addWidget(self.sharpen_cc_mode)
-			sharpen_cc_layout.addWidget(create_aligned_label("Stellar"))
-			sharpen_cc_layout.addWidget(self.sharpen_cc_stellar_amount)
-			sharpen_cc_layout.addWidget(create_aligned_label("Non-Stellar"))
-			sharpen_cc_layout.addWidget(self.sharpen_cc_non_stellar_amount)
-			sharpen_cc_layout.addWidget(create_aligned_label("Strength"))
-			sharpen_cc_layout.addWidget(self.sharpen_cc_non_stellar_strength)
-			sharpen_cc_layout.addStretch()
-			add_aligned_row(sharpen_form, self.sharpen_cc_cb, sharpen_cc_layout)
 
 			self.sharpen_ssa_cb = QCheckBox("Setiastro CC Sharpen")
 			self.sharpen_ssa_mode = QComboBox()
 			self.sharpen_ssa_mode.addItems(['Both', 'Stellar Only' ,'Non-Stellar Only'])
 			self.sharpen_ssa_stellar_amount = QLineEdit("0.5")
 			self.sharpen_ssa_non_stellar_amount = QLineEdit("0.5")
-			self.sharpen_ssa_mode.setFixedWidth(80)
-			self.sharpen_ssa_mode.setEnabled(False)
-			for w in [self.sharpen_ssa_stellar_amount, self.sharpen_ssa_non_stellar_amount]:
-				w.setFixedWidth(40)
-				w.setEnabled(False)
-			self.sharpen_ssa_cb.toggled.connect(self.sharpen_ssa_mode.setEnabled)
-			self.sharpen_ssa_cb.toggled.connect(self.sharpen_ssa_stellar_amount.setEnabled)
-			self.sharpen_ssa_cb.toggled.connect(self.sharpen_ssa_non_stellar_amount.setEnabled)
+			add_stage_row(sharpen_form, self.sharpen_ssa_cb, [
+				("Mode", self.sharpen_ssa_mode, 80),
+				("Stellar", self.sharpen_ssa_stellar_amount, 40),
+				("Non-Stellar", self.sharpen_ssa_non_stellar_amount, 40)])
 			self.sharpen_ssa_mode.currentTextChanged.connect(self.update_sharpen_ssa_options)
-			sharpen_ssa_layout = QHBoxLayout()
-			sharpen_ssa_layout.setSpacing(10)
-			sharpen_ssa_layout.addWidget(create_aligned_label("Mode"))
-			sharpen_ssa_layout.addWidget(self.sharpen_ssa_mode)
-			sharpen_ssa_layout.addWidget(create_aligned_label("Stellar"))
-			sharpen_ssa_layout.addWidget(self.sharpen_ssa_stellar_amount)
-			sharpen_ssa_layout.addWidget(create_aligned_label("Non-Stellar"))
-			sharpen_ssa_layout.addWidget(self.sharpen_ssa_non_stellar_amount)
-			sharpen_ssa_layout.addStretch()
-			add_aligned_row(sharpen_form, self.sharpen_ssa_cb, sharpen_ssa_layout)
 
 			self.sharpen_grax_cb = QCheckBox("GraXpert Sharpen")
 			self.sharpen_grax_mode = QComboBox()
 			self.sharpen_grax_mode.addItems(['both', 'object' ,'stellar'])
 			self.sharpen_grax_strength = QLineEdit("0.5")
-			self.sharpen_grax_mode.setFixedWidth(80)
-			self.sharpen_grax_mode.setEnabled(False)
-			for w in [self.sharpen_grax_strength]:
-				w.setFixedWidth(40)
-				w.setEnabled(False)
-			self.sharpen_grax_cb.toggled.connect(self.sharpen_grax_mode.setEnabled)
-			self.sharpen_grax_cb.toggled.connect(self.sharpen_grax_strength.setEnabled)
-			sharpen_grax_layout = QHBoxLayout()
-			sharpen_grax_layout.setSpacing(10)
-			sharpen_grax_layout.addWidget(create_aligned_label("Mode"))
-			sharpen_grax_layout.addWidget(self.sharpen_grax_mode)	
-			sharpen_grax_layout.addWidget(create_aligned_label("Strength"))
-			sharpen_grax_layout.addWidget(self.sharpen_grax_strength)
-			sharpen_grax_layout.addStretch()
-			add_aligned_row(sharpen_form, self.sharpen_grax_cb, sharpen_grax_layout)
+			add_stage_row(sharpen_form, self.sharpen_grax_cb, [
+				("Mode", self.sharpen_grax_mode, 80),
+				("Strength", self.sharpen_grax_strength, 40)])
 			scroll_layout.addWidget(sharpen_group)
 
 			# --- 3. Denoising Group ---
@@ -746,57 +772,23 @@ def run_gui():
 			self.denoise_cc_mode = QComboBox()
 			self.denoise_cc_mode.addItems(['full', 'luminance', 'separate'])
 			self.denoise_cc_strength = QLineEdit("0.5")
-			self.denoise_cc_mode.setFixedWidth(80)
-			self.denoise_cc_mode.setEnabled(False)
-			self.denoise_cc_strength.setFixedWidth(40)
-			self.denoise_cc_strength.setEnabled(False)
-			self.denoise_cc_cb.toggled.connect(self.denoise_cc_mode.setEnabled)
-			self.denoise_cc_cb.toggled.connect(self.denoise_cc_strength.setEnabled)
-			denoise_cc_layout = QHBoxLayout()
-			denoise_cc_layout.setSpacing(10)
-			denoise_cc_layout.addWidget(create_aligned_label("Mode"))
-			denoise_cc_layout.addWidget(self.denoise_cc_mode)
-			denoise_cc_layout.addWidget(create_aligned_label("Strength"))
-			denoise_cc_layout.addWidget(self.denoise_cc_strength)
-			denoise_cc_layout.addStretch()
-			add_aligned_row(denoise_form, self.denoise_cc_cb, denoise_cc_layout)
+			add_stage_row(denoise_form, self.denoise_cc_cb, [
+				("Mode", self.denoise_cc_mode, 80),
+				("Strength", self.denoise_cc_strength, 40)])
 
 			self.denoise_dsa_cb = QCheckBox("Setiastro CC Denoise")
 			self.denoise_dsa_mode = QComboBox()
 			self.denoise_dsa_mode.addItems(['full', 'luminance'])
-			self.denoise_dsa_mode.setFixedWidth(80)
 			self.denoise_dsa_luma_amount = QLineEdit("0.5")
-			self.denoise_dsa_luma_amount.setFixedWidth(40)
 			self.denoise_dsa_color_amount = QLineEdit("0.5")
-			self.denoise_dsa_color_amount.setFixedWidth(40)
-			self.denoise_dsa_mode.setEnabled(False)
-			self.denoise_dsa_luma_amount.setEnabled(False)
-			self.denoise_dsa_color_amount.setEnabled(False)			
-			self.denoise_dsa_cb.toggled.connect(self.denoise_dsa_mode.setEnabled)
-			self.denoise_dsa_cb.toggled.connect(self.denoise_dsa_luma_amount.setEnabled)
-			self.denoise_dsa_cb.toggled.connect(self.denoise_dsa_color_amount.setEnabled)			
-			denoise_dsa_layout = QHBoxLayout()
-			denoise_dsa_layout.setSpacing(10)
-			denoise_dsa_layout.addWidget(create_aligned_label("Mode"))
-			denoise_dsa_layout.addWidget(self.denoise_dsa_mode)
-			denoise_dsa_layout.addWidget(create_aligned_label("Luma"))
-			denoise_dsa_layout.addWidget(self.denoise_dsa_luma_amount)
-			denoise_dsa_layout.addWidget(create_aligned_label("Color"))
-			denoise_dsa_layout.addWidget(self.denoise_dsa_color_amount)
-			denoise_dsa_layout.addStretch()
-			add_aligned_row(denoise_form, self.denoise_dsa_cb, denoise_dsa_layout)
+			add_stage_row(denoise_form, self.denoise_dsa_cb, [
+				("Mode", self.denoise_dsa_mode, 80),
+				("Luma", self.denoise_dsa_luma_amount, 40),
+				("Color", self.denoise_dsa_color_amount, 40)])
 
 			self.denoise_grax_cb = QCheckBox("GraXpert Denoise")
 			self.denoise_grax_strength = QLineEdit("0.5")
-			self.denoise_grax_strength.setFixedWidth(40)
-			self.denoise_grax_strength.setEnabled(False)
-			self.denoise_grax_cb.toggled.connect(self.denoise_grax_strength.setEnabled)
-			denoise_grax_layout = QHBoxLayout()
-			denoise_grax_layout.setSpacing(10)
-			denoise_grax_layout.addWidget(create_aligned_label("Strength"))
-			denoise_grax_layout.addWidget(self.denoise_grax_strength)
-			denoise_grax_layout.addStretch()
-			add_aligned_row(denoise_form, self.denoise_grax_cb, denoise_grax_layout)
+			add_stage_row(denoise_form, self.denoise_grax_cb, [("Strength", self.denoise_grax_strength, 40)])
 			scroll_layout.addWidget(denoise_group)
 
 			# --- 4. Finalization Group ---
@@ -810,24 +802,15 @@ def run_gui():
 			self.stretch_hdr_amount = QLineEdit("0.15")
 			self.stretch_hdr_knee = QLineEdit("0.75")
 			self.stretch_boost_amount = QLineEdit("0.2")
-			self.stretch_hdr_amount.setFixedWidth(80)
-			self.stretch_hdr_amount.setEnabled(False)
-			for w in [self.stretch_hdr_knee, self.stretch_boost_amount]:
-				w.setFixedWidth(40)
-				w.setEnabled(False)
-			self.stretch_cb.toggled.connect(self.stretch_hdr_amount.setEnabled)
-			self.stretch_cb.toggled.connect(self.stretch_hdr_knee.setEnabled)
-			self.stretch_cb.toggled.connect(self.stretch_boost_amount.setEnabled)
-			stretch_layout = QHBoxLayout()
-			stretch_layout.setSpacing(10)
-			stretch_layout.addWidget(create_aligned_label("HDR"))
-			stretch_layout.addWidget(self.stretch_hdr_amount)
-			stretch_layout.addWidget(create_aligned_label("Knee"))
-			stretch_layout.addWidget(self.stretch_hdr_knee)
-			stretch_layout.addWidget(create_aligned_label("Boost"))
-			stretch_layout.addWidget(self.stretch_boost_amount)
-			stretch_layout.addStretch()
-			add_aligned_row(final_form, self.stretch_cb, stretch_layout)
+			add_stage_row(final_form, self.stretch_cb, [
+				("HDR", self.stretch_hdr_amount, 80),
+				("Knee", self.stretch_hdr_knee, 40),
+				("Boost", self.stretch_boost_amount, 40)])
+
+			self.compress_cb = QCheckBox("Compress output")
+			self.compress_cb.setToolTip("Saves processed images as tile compressed fit.fz files")
+			self.compress_cb.setFixedWidth(250)
+			final_form.addRow(self.compress_cb)
 
 			self.multiprocess_cb = QCheckBox("Multiprocess directories")
 			self.multiprocess_cb.setToolTip("Saves processed images in unique Processed_N directory")
@@ -889,6 +872,36 @@ def run_gui():
 					self.spcc_filter1.addItems(redfilters)
 					self.spcc_filter2.addItems(greenfilters)
 					self.spcc_filter3.addItems(bluefilters)
+
+		def accept(self):
+			# check the numbers before starting, siril would only reject them part way through a run
+			numeric = [
+				(self.crop_cb, [self.crop_value]),
+				(self.starnet_cb, [self.scale_factor, self.stride, self.combine_factor]),
+				(self.abe_cb, [self.abe_npoints, self.abe_polydegree, self.abe_rbfsmooth]),
+				(self.bkg_cb, [self.bkg_smooth]),
+				(self.bkg_grax_cb, [self.bkg_grax_smooth]),
+				(self.sharpen_cc_cb, [self.sharpen_cc_stellar_amount, self.sharpen_cc_non_stellar_amount, self.sharpen_cc_non_stellar_strength]),
+				(self.sharpen_ssa_cb, [self.sharpen_ssa_stellar_amount, self.sharpen_ssa_non_stellar_amount]),
+				(self.sharpen_grax_cb, [self.sharpen_grax_strength]),
+				(self.denoise_cc_cb, [self.denoise_cc_strength]),
+				(self.denoise_dsa_cb, [self.denoise_dsa_luma_amount, self.denoise_dsa_color_amount]),
+				(self.denoise_grax_cb, [self.denoise_grax_strength]),
+				(self.stretch_cb, [self.stretch_hdr_amount, self.stretch_hdr_knee, self.stretch_boost_amount]),
+			]
+			for checkbox, fields in numeric:
+				if not checkbox.isChecked():
+					continue
+				for field in fields:
+					for value in field.text().split() or [""]:
+						try:
+							float(value)
+						except ValueError:
+							QMessageBox.warning(self, "Invalid value", f"{checkbox.text()}: '{field.text()}' is not a number")
+							field.setFocus()
+							return
+			super().accept()
+
 		def get_values(self):
 			return {
 				"workdir": self.workdir_input.text(),
@@ -900,6 +913,7 @@ def run_gui():
 				"denoiseCC": [self.denoise_cc_mode.currentText(), self.denoise_cc_strength.text()] if self.denoise_cc_cb.isChecked() else None,
 				"denoiseSA": [self.denoise_dsa_mode.currentText(), self.denoise_dsa_luma_amount.text(), self.denoise_dsa_color_amount.text()] if self.denoise_dsa_cb.isChecked() else None,
 				"denoiseGraX": self.denoise_grax_strength.text() if self.denoise_grax_cb.isChecked() else None,
+				"compress": self.compress_cb.isChecked(),
 				"multiprocess": self.multiprocess_cb.isChecked(),
 				"sharpen": self.sharpen_cb.isChecked(),
 				"sharpenCC": [self.sharpen_cc_mode.currentText(), self.sharpen_cc_stellar_amount.text(), self.sharpen_cc_non_stellar_amount.text(), self.sharpen_cc_non_stellar_strength.text()] if self.sharpen_cc_cb.isChecked() else None,
@@ -915,44 +929,10 @@ def run_gui():
 
 	app = QApplication.instance() or QApplication(sys.argv)
 
-	dark_stylesheet = """
-		QWidget {
-			background-color: #2b2b2b;
-			color: #efefef;
-		}
-		QLineEdit, QTextEdit, QComboBox {
-			background-color: #3b3b3b;
-			color: #efefef;
-			border: 1px solid #555;
-			padding: 2px;
-		}
-		QPushButton {
-			background-color: #4b4b4b;
-			color: #efefef;
-			border: 1px solid #555;
-			padding: 5px;
-			border-radius: 3px;
-		}
-		QPushButton:hover {
-			background-color: #5b5b5b;
-		}
-		QPushButton:pressed {
-			background-color: #3b3b3b;
-		}
-		QCheckBox {
-			spacing: 5px;
-		}
-		QCheckBox::indicator {
-			width: 15px;
-			height: 15px;
-			background-color: #3b3b3b;
-			border: 1px solid #555;
-		}
-		QCheckBox::indicator:checked {
-			background-color: #4b9ee3;
-		}
-	"""
-	app.setStyleSheet(dark_stylesheet)
+	# style the QApplication once, it is reused when the dialog is opened again
+	if not getattr(app, "gps_styled", False):
+		app.setStyleSheet(DARK_STYLESHEET)
+		app.gps_styled = True
 
 	dialog = ProcessingDialog()
 	if dialog.exec():
@@ -979,10 +959,13 @@ def run_gui():
 			cli_args.extend(["-dg", values["denoiseGraX"]])
 		if values["sharpen"]:
 			cli_args.append("-s")
+		# only the values the selected sharpen mode uses, in the order main_logic reads them
 		if values["sharpenCC"]:
-			cli_args.extend(["-sc", values["sharpenCC"][0], values["sharpenCC"][1], values["sharpenCC"][2], values["sharpenCC"][3]])
+			fields = dict(zip(('stellar', 'non_stellar', 'strength'), values["sharpenCC"][1:]))
+			cli_args.extend(["-sc", values["sharpenCC"][0]] + [fields[name] for name in SHARPEN_CC_LAYOUT[values["sharpenCC"][0]]])
 		if values["sharpenSA"]:
-			cli_args.extend(["-ssa", values["sharpenSA"][0], values["sharpenSA"][1], values["sharpenSA"][2]])		
+			fields = dict(zip(('stellar', 'non_stellar'), values["sharpenSA"][1:]))
+			cli_args.extend(["-ssa", values["sharpenSA"][0]] + [fields[name] for name in SHARPEN_SA_LAYOUT[values["sharpenSA"][0]]])
 		if values["sharpenGraX"]:
 			cli_args.extend(["-sg", values["sharpenGraX"][0], values["sharpenGraX"][1]])
 		if values["starnet"]:
@@ -998,11 +981,13 @@ def run_gui():
 			cli_args.append("-as")
 		if values["statstretch"]:
 			cli_args.extend(["-ss", values["statstretch"][0], values["statstretch"][1], values["statstretch"][2]])
+		if values["compress"]:
+			cli_args.append("-fz")
 		if values["multiprocess"]:
 			cli_args.append("-m")
 
 		print(*cli_args)
-		main_logic(cli_args)
+		main_logic(cli_args, is_gui=True)
 
 		msg_box = QMessageBox()
 		msg_box.setIcon(QMessageBox.Icon.Information)
@@ -1014,186 +999,208 @@ def run_gui():
 # Main execution
 # ==============================================================================	
 
-def main_logic(argv):
-	global args, npoints, crop, crop_value, polydegree, rbfsmooth, smooth, bkgGraX, denoiseCC_mode, denoiseCC_strength, denoiseGraX, denoiseSA_mode, denoiseSA_luma_amount, denoiseSA_color_amount, sharpenGraX_mode, sharpenGraX_strength, sharpenCC_mode, sharpenCC_stellar_amount, sharpenCC_non_stellar_amount, sharpenCC_non_stellar_strength, sharpenSA_mode, sharpenSA_stellar_amount, sharpenSA_non_stellar_amount, autostretch, starnet, stretch_hdr_amount, stretch_hdr_knee, stretch_boost_amount, spcc_sensor, spcc_oscfilter, spcc_rfilter, spcc_gfilter, spcc_bfilter, Type, sensors, osc_sensors, mono_sensors
+# built once, main_logic is called repeatedly from a batch
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument("-ab","--abe", nargs='+', action='append', help="AutoBGE, provide npoints, polydegree and rbfsmooth")
+PARSER.add_argument("-as","--autostretch", help="Siril autostretch (linked)" ,action="store_true")
+PARSER.add_argument("-B","--batch", help="run each argument list in a JSON file in turn, using one siril connection")
+PARSER.add_argument("-b","--bkg", nargs='+', action='append', help="siril background extraction, provide smoothing 0.0-1.0")
+PARSER.add_argument("-bg","--bkgGraX", nargs='+', action='append', help="GraXpert background extraction, provide smoothing 0.0-1.0")
+PARSER.add_argument("-c","--crop", nargs='+', help="crop image by percentage, accepts multiple values for different crops")
+PARSER.add_argument("-cc","--spcc", nargs='+', help="spcc color calibration, provide sensor and filter(s) OSC or R, G & B, using quotes")
+PARSER.add_argument("-d","--workdir", nargs='+', help="set working directory")
+PARSER.add_argument("-j","--jobs", type=int, help="number of threads siril uses for processing, by default siril uses every core it may run on")
+PARSER.add_argument("-fz","--compress", help="save processed images tile compressed (rice), halves the bytes moved between stages" ,action="store_true")
+
+PARSER.add_argument("-dc","--denoiseCC", nargs='+', action='append', help="run CC denoise, provide mode (luminance, full, separate) and denoise strength 0.0-1.0")
+PARSER.add_argument("-dg","--denoiseGraX", nargs='+', action='append', help="denoise using GraXpert-AI, provide strength 0.0-1.0")
+PARSER.add_argument("-dsa","--denoiseSA", nargs='+', action='append' ,help="run SASpro CC denoise, provide mode (full or luminance), luminance denoise strength (0.0-1.0) and color denoise strength (0.0-1.0)")
+PARSER.add_argument("-ds","--denoise", help="run denoise" ,action="store_true")
+PARSER.add_argument("-m","--multiprocess", help="saves processed images in unique Processed_N directory" ,action="store_true")	
+PARSER.add_argument("-s","--sharpen", help="sharpen (deconvolution)" ,action="store_true")
+PARSER.add_argument("-sc","--sharpenCC", nargs='+', action='append' ,help="run CC sharpen, provide mode (Stellar Only,Non-Stellar Only,Both), Stellar_amount and/or Non_stellar_amount and Non_stellar_strength")
+PARSER.add_argument("-sg","--sharpenGraX", nargs='+', action='append', help="sharpen (deconvolution) using GraXpert-AI, provide mode (both, object, stellar) and strength 0.0-1.0")
+PARSER.add_argument("-sn","--starnet", nargs=3, help="create starless & starmask, sharpen and/or denoise run on starless, then recombines. Provide scale factor (1 or 2), stride value (default 256) and star combine factor (0-1)", type = float)
+PARSER.add_argument("-sy","--synthstar", help="Runs synthstar on starmask to correct misshapen stars" ,action="store_true")	
+PARSER.add_argument("-ssa","--sharpenSA", nargs='+', action='append' ,help="run SASpro CC sharpen, provide mode (Stellar Only,Non-Stellar Only,Both), Stellar_amount and/or Non_stellar_amount")
+PARSER.add_argument("-ss","--statstretch", nargs='+', action='append', help="statistical stretch, provide HDR amount, HDR knee and boost amount")
+PARSER.add_argument("-v","--version", help="print the version and exit",action="store_true")
+
+def main_logic(argv, is_gui=False, in_batch=False):
+	global connected, args, original_images, npoints, crop, crop_value, polydegree, rbfsmooth, smooth, bkgGraX, denoiseCC_mode, denoiseCC_strength, denoiseGraX, denoiseSA_mode, denoiseSA_luma_amount, denoiseSA_color_amount, sharpenGraX_mode, sharpenGraX_strength, sharpenCC_mode, sharpenCC_stellar_amount, sharpenCC_non_stellar_amount, sharpenCC_non_stellar_strength, sharpenSA_mode, sharpenSA_stellar_amount, sharpenSA_non_stellar_amount, autostretch, starnet, stretch_hdr_amount, stretch_hdr_knee, stretch_boost_amount, spcc_sensor, spcc_oscfilter, spcc_rfilter, spcc_gfilter, spcc_bfilter, Type, sensors, osc_sensors, mono_sensors
 	
-	parser = argparse.ArgumentParser()
-	parser.add_argument("-ab","--abe", nargs='+', action='append', help="AutoBGE, provide npoints, polydegree and rbfsmooth")
-	parser.add_argument("-as","--autostretch", help="Siril autostretch (linked)" ,action="store_true")
-	parser.add_argument("-b","--bkg", nargs='+', action='append', help="siril background extraction, provide smoothing 0.0-1.0")
-	parser.add_argument("-bg","--bkgGraX", nargs='+', action='append', help="GraXpert background extraction, provide smoothing 0.0-1.0")
-	parser.add_argument("-c","--crop", nargs='+', help="crop image by percentage, accepts multiple values for different crops")
-	parser.add_argument("-cc","--spcc", nargs='+', help="spcc color calibration, provide sensor and filter(s) OSC or R, G & B, using quotes")
-	parser.add_argument("-d","--workdir", nargs='+', help="set working directory")
-
-	parser.add_argument("-dc","--denoiseCC", nargs='+', action='append', help="run CC denoise, provide mode (luminance, full, separate) and denoise strength 0.0-1.0")
-	parser.add_argument("-dg","--denoiseGraX", nargs='+', action='append', help="denoise using GraXpert-AI, provide strength 0.0-1.0")
-	parser.add_argument("-dsa","--denoiseSA", nargs='+', action='append' ,help="run SASpro CC denoise, provide mode (full or luminance), luminance denoise strength (0.0-1.0) and color denoise strength (0.0-1.0)")
-	parser.add_argument("-ds","--denoise", help="run denoise" ,action="store_true")
-	parser.add_argument("-m","--multiprocess", help="saves processed images in unique Processed_N directory" ,action="store_true")	
-	parser.add_argument("-s","--sharpen", help="sharpen (deconvolution)" ,action="store_true")
-	parser.add_argument("-sc","--sharpenCC", nargs='+' ,help="run CC sharpen, provide mode (Stellar Only,Non-Stellar Only,Both), Stellar_amount and/or Non_stellar_amount and Non_stellar_strength")
-	parser.add_argument("-sg","--sharpenGraX", nargs='+', action='append', help="sharpen (deconvolution) using GraXpert-AI, provide mode (both, object, stellar) and strength 0.0-1.0")
-	parser.add_argument("-sn","--starnet", nargs=3, help="create starless & starmask, sharpen and/or denoise run on starless, then recombines. Provide scale factor (1 or 2), stride value (default 256) and star combine factor (0-1)", type = float)
-	parser.add_argument("-sy","--synthstar", help="Runs synthstar on starmask to correct misshapen stars" ,action="store_true")	
-	parser.add_argument("-ssa","--sharpenSA", nargs='+', action='append' ,help="run SASpro CC sharpen, provide mode (Stellar Only,Non-Stellar Only,Both), Stellar_amount and/or Non_stellar_amount")
-	parser.add_argument("-ss","--statstretch", nargs='+', action='append', help="statistical stretch, provide HDR amount, HDR knee and boost amount")
-	parser.add_argument("-v","--version", help="print the version and exit",action="store_true")
-	args = parser.parse_args(argv)
+	args = PARSER.parse_args(argv)
 
 	if args.version:
 		print('version ' + VERSION)
 		sys.exit(1)
+
+	if args.batch:
+		try:
+			if in_batch:
+				raise ArgError("-B cannot be used inside a batch entry")
+			with open(args.batch) as f:
+				runs = json.load(f)
+			if not isinstance(runs, list) or not all(isinstance(run, list) for run in runs):
+				raise ArgError(f"{args.batch} needs to hold a list of argument lists")
+		except (OSError, ValueError) as e:
+			show_error(e, is_gui)
+			return
+		for run in runs:
+			main_logic([str(a) for a in run], is_gui, in_batch=True)
+		return
 	
 	try:
-		siril.connect()
+		if args.starnet and args.starnet[0] not in (1, 2):
+			raise ArgError("Upscale factor needs to be a 1 or 2")
+
+		if not connected:
+			siril.connect()
+			connected = True
 		siril.cmd("requires", "1.3.6")	
 		siril.log("Running processing")
-		workdir = args.workdir[0] if args.workdir else os.getcwd()	
+		# absolute, so siril's cd and this script's own file access agree on relative paths
+		workdir = os.path.realpath(args.workdir[0] if args.workdir else CWD)
 		siril.cmd("cd",f'"{workdir}"')
 		siril.cmd("set32bits")
 		siril.cmd("setext", "fit")
-
-		os.chdir(workdir)
-		for image in os.listdir():
-			if image.endswith(('.fits', '.fit', '.fts', '.fz')):
-				original_images.append(f"{image}")
-
-		if args.crop:
-			crop(workdir)
+		# each run in a batch starts from its own working directory
+		processed_images.clear()
+		original_images = frozenset(fits_images(workdir))
+		if not original_images:
+			siril.log(f"No fit images found in {workdir}")
+			return
+		siril.log(f"Processing {len(original_images)} images")
+
+		compressed = siril.get_siril_config('compression','enabled')
+		if args.compress and not compressed:
+			siril.cmd("setcompress", "1", "-type=rice", "16")
+		if args.jobs:
+			siril.cmd("setcpu", str(args.jobs))
+
+		try:
+			if args.crop:
+				crop(workdir)
 		
-		if args.starnet:
-			starnet(workdir)
-
-		if args.abe:
-			for n in args.abe:
-				npoints = (n[0])
-				polydegree = (n[1])
-				rbfsmooth = (n[2])
-				abe(workdir)
+			if args.starnet:
+				starnet(workdir)
+
+			if args.abe:
+				for n in args.abe:
+					npoints, polydegree, rbfsmooth = n[:3]
+					abe(workdir)
 				
-		if args.bkg:
-			for n in args.bkg:
-				smooth = (n[0])			
-				bkg(workdir)
-
-		if args.bkgGraX:
-			for n in args.bkgGraX:
-				bkgGraX = (n[0])
-				bkg_GraX(workdir)
-
-		if args.spcc:
-			spcc_sensor = (args.spcc[0])
-			if (len (args.spcc)) == 2:
-				Type = 'OSC'
-				spcc_oscfilter = (args.spcc[1])
-			elif (len (args.spcc)) == 4:
-				Type = 'mono'
-				spcc_rfilter = (args.spcc[1])
-				spcc_gfilter = (args.spcc[2])				
-				spcc_bfilter = (args.spcc[3])				
-			else:
-				print("spcc needs 2 args for OSC or 4 args for mono")
-				sys.exit(1)
-			spcc(workdir)			
-
-		if args.sharpen:
-			sharpen(workdir)
-
-		if args.sharpenCC:
-			for n in args.sharpenCC:			
-				sharpenCC_mode = (n[0])
-				if (n[0]) == 'Both':
-					sharpenCC_stellar_amount = (n[1])
-					sharpenCC_non_stellar_amount = (n[2])	
-					sharpenCC_non_stellar_strength = (n[3])
-				elif (n[0]) == 'Non-Stellar Only':
-					sharpenCC_non_stellar_amount = (n[1])	
-					sharpenCC_non_stellar_strength = (n[2])						
-					sharpenCC_stellar_amount = '0'
-				elif (n[0]) == 'Stellar Only':
-					sharpenCC_stellar_amount = (n[1])			
-					sharpenCC_non_stellar_amount = '0'	
-					sharpenCC_non_stellar_strength = '0'		
+			if args.bkg:
+				for n in args.bkg:
+					smooth = n[0]
+					bkg(workdir)
+
+			if args.bkgGraX:
+				for n in args.bkgGraX:
+					bkgGraX = n[0]
+					bkg_GraX(workdir)
+
+			if args.spcc:
+				if len(args.spcc) == 2:
+					Type = 'OSC'
+					spcc_sensor, spcc_oscfilter = args.spcc
+				elif len(args.spcc) == 4:
+					Type = 'mono'
+					spcc_sensor, spcc_rfilter, spcc_gfilter, spcc_bfilter = args.spcc
 				else:
-					print('Mode needs to be either Both, Stellar Only or Non-Stellar Only')
-					sys.exit(1)
-				sharpen_CC(workdir)
+					raise ArgError("spcc needs 2 args for OSC or 4 args for mono")
+				spcc(workdir)			
+
+			if args.sharpen:
+				sharpen(workdir)
+
+			if args.sharpenCC:
+				for n in args.sharpenCC:
+					layout = SHARPEN_CC_LAYOUT.get(n[0])
+					if layout is None:
+						raise ArgError('Mode needs to be either Both, Stellar Only or Non-Stellar Only')
+					if len(n) <= len(layout):
+						raise ArgError(f"{n[0]} needs {len(layout)} values: {', '.join(layout)}")
+					values = dict(zip(layout, n[1:]))
+					sharpenCC_mode = n[0]
+					sharpenCC_stellar_amount = values.get('stellar', '0')
+					sharpenCC_non_stellar_amount = values.get('non_stellar', '0')
+					sharpenCC_non_stellar_strength = values.get('strength', '0')
+					sharpen_CC(workdir)
 			
-		if args.sharpenGraX:
-			for n in args.sharpenGraX:
-				sharpenGraX_mode = (n[0])
-				sharpenGraX_strength = (n[1])
-				sharpen_GraX(workdir)
-
-		if args.sharpenSA:
-			for n in args.sharpenSA:			
-				sharpenSA_mode = (n[0])
-				if (n[0]) == 'Both':
-					sharpenSA_stellar_amount = (n[1])
-					sharpenSA_non_stellar_amount = (n[2])	
-				elif (n[0]) == 'Non-Stellar Only':
-					sharpenSA_non_stellar_amount = (n[1])	
-					sharpenSA_stellar_amount = '0'
-				elif (n[0]) == 'Stellar Only':
-					sharpenSA_stellar_amount = (n[1])			
-					sharpenSA_non_stellar_amount = '0'	
-				else:
-					print('Mode needs to be either Both, Stellar Only or Non-Stellar Only')
-					sys.exit(1)
-				sharpen_SA(workdir)
+			if args.sharpenGraX:
+				for n in args.sharpenGraX:
+					sharpenGraX_mode, sharpenGraX_strength = n[:2]
+					sharpen_GraX(workdir)
+
+			if args.sharpenSA:
+				for n in args.sharpenSA:
+					layout = SHARPEN_SA_LAYOUT.get(n[0])
+					if layout is None:
+						raise ArgError('Mode needs to be either Both, Stellar Only or Non-Stellar Only')
+					if len(n) <= len(layout):
+						raise ArgError(f"{n[0]} needs {len(layout)} values: {', '.join(layout)}")
+					values = dict(zip(layout, n[1:]))
+					sharpenSA_mode = n[0]
+					sharpenSA_stellar_amount = values.get('stellar', '0')
+					sharpenSA_non_stellar_amount = values.get('non_stellar', '0')
+					sharpen_SA(workdir)
 				
-		if args.denoise:
-			denoise(workdir)
-
-		if args.denoiseCC:
-			for n in args.denoiseCC:
-				denoiseCC_mode = (n[0])
-				denoiseCC_strength = (n[1])
-				denoise_CC(workdir)
+			if args.denoise:
+				denoise(workdir)
+
+			if args.denoiseCC:
+				for n in args.denoiseCC:
+					denoiseCC_mode, denoiseCC_strength = n[:2]
+					denoise_CC(workdir)
 			
-		if args.denoiseSA:
-			for n in args.denoiseSA:
-				denoiseSA_mode = (n[0])
-				denoiseSA_luma_amount = (n[1])
-				denoiseSA_color_amount = (n[2])
-				denoise_SA(workdir)
-
-		if args.denoiseGraX:
-			for n in args.denoiseGraX:
-				denoiseGraX = (n[0])
-				denoise_GraX(workdir)
-
-		if args.starnet:
-			pixelmath(workdir)
-
-		if args.autostretch:
-			autostretch(workdir)
+			if args.denoiseSA:
+				for n in args.denoiseSA:
+					denoiseSA_mode, denoiseSA_luma_amount, denoiseSA_color_amount = n[:3]
+					denoise_SA(workdir)
+
+			if args.denoiseGraX:
+				for n in args.denoiseGraX:
+					denoiseGraX = n[0]
+					denoise_GraX(workdir)
+
+			if args.starnet:
+				pixelmath(workdir)
+
+			if args.autostretch:
+				autostretch(workdir)
 		
-		if args.statstretch:
-			for n in args.statstretch:
-				stretch_hdr_amount = (n[0])
-				stretch_hdr_knee = (n[1])
-				stretch_boost_amount = (n[2])
-				statstretch(workdir)
+			if args.statstretch:
+				for n in args.statstretch:
+					stretch_hdr_amount, stretch_hdr_knee, stretch_boost_amount = n[:3]
+					statstretch(workdir)
 				
-		if args.multiprocess:
-			multiprocess(workdir)
+			if args.multiprocess:
+				multiprocess(workdir)
+		finally:
+			# compression and threads are siril wide settings, put them back even when a stage fails
+			if args.compress and not compressed:
+				siril.cmd("setcompress", "0")
+			# siril does not report its thread count, it starts with one per usable processor
+			if args.jobs:
+				siril.cmd("setcpu", str(len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()))
 
 	except Exception as e:
-		print("\n**** ERROR *** " + str(e) + "\n")
-		if 'QApplication' in globals() and QApplication.instance():
-			msg_box = QMessageBox()
-			msg_box.setIcon(QMessageBox.Icon.Critical)
-			msg_box.setText("An error occurred during processing.")
-			msg_box.setInformativeText(str(e))
-			msg_box.setWindowTitle("Error")
-			msg_box.exec()
+		show_error(e, is_gui)
 			
-if __name__ == '__main__':
+def main():
+	global siril
 	siril = s.SirilInterface()
 
-	if len(sys.argv) == 1:
-		run_gui()
-	else:
-		main_logic(sys.argv[1:])
+	# one connection is kept across gui runs and batch entries, release it when the script ends
+	try:
+		if len(sys.argv) == 1:
+			run_gui()
+		else:
+			main_logic(sys.argv[1:])
+	finally:
+		if connected:
+			siril.disconnect()
+
+if __name__ == '__main__':
+	main()